@@ -4,9 +4,30 @@ const ctx     = canvas.getContext('2d');
 
 let sessionId  = null;
 let numPlayers = 1;
+let levelNum   = 1;
 let gameState  = null;
 let running    = false;
 let won        = false;
+let spectating = false;  // watching someone else's session (?spectate=<spectate token>)
+let spectateToken = null;  // ours to share when playing, theirs when watching
+let spectateHz    = undefined;
+let apiBase    = '';     // origin of game requests: this page's, or the session's worker (shards.py --direct)
+
+// Socket.IO channel (falls back to polling /api/input if the client lib is missing)
+let socket     = null;
+let lastSent   = null;  // JSON of the last input payload pushed over the socket
+
+// Wire format negotiated at start_game: 'binary' frames/inputs (see server/wire.py) or 'json'
+const WANT_ENCODING = typeof DataView === 'function' ? 'binary' : 'json';
+let encoding   = 'json';
+
+// Without the socket the session runs on our clock: every local tick's input
+// is buffered and sent in batches to /api/input_batch, resending until acked.
+const BATCH_TICKS = 4;   // send a batch every 4 ticks (~133 ms)
+const MAX_BATCH   = 90;  // server limit per request
+let clientClock  = false;
+let outbox       = [];   // [{ seq, inputs }] not yet acknowledged by the server
+let batchPending = false;
 
 // Tracks which keys are currently held
 const keys = {};
@@ -24,16 +45,30 @@ document.addEventListener('keyup',   e => { keys[e.code] = false; });
 // ── Game Start / Menu ──────────────────────────────────────────────────────
 async function startGame(mode, level = 1) {
   numPlayers = mode;
+  levelNum   = level;
   // Mark that the user has played at least once
   localStorage.setItem('hasPlayed', 'true');
 
   const res  = await fetch('/api/start_game', {
     method:  'POST',
     headers: { 'Content-Type': 'application/json' },
-    body:    JSON.stringify({ mode, level })
+    body:    JSON.stringify({
+      mode, level,
+      encoding: WANT_ENCODING,
+      clock:    typeof io === 'function' ? 'server' : 'client'
+    })
   });
-  const data = await res.json();
-  sessionId  = data.session_id;
+  const data  = await res.json();
+  sessionId   = data.session_id;
+  encoding    = data.encoding || 'json';
+  clientClock = data.clock === 'client';
+  outbox      = [];
+  spectateToken = data.spectate_token || null;
+  if (spectateToken) {
+    console.info('Watch this game at', `${location.origin}${location.pathname}?spectate=${spectateToken}`);
+  }
+  // Behind shards.py --direct the session's worker has a port of its own
+  apiBase     = data.port ? `${location.protocol}//${location.hostname}:${data.port}` : '';
 
   // Show/hide HUD controls hint for P2
   document.getElementById('hud-p2-controls').style.display =
@@ -45,14 +80,123 @@ async function startGame(mode, level = 1) {
 
   won     = false;
   running = true;
+  resetPrediction();
+  connectSocket();
   gameLoop();
 }
 
+function connectSocket() {
+  if (typeof io !== 'function') return;
+  // session_id in the query lets a sharded server route the connection (server/shards.py)
+  const options = { query: { session_id: sessionId } };
+  socket = apiBase ? io(apiBase, options) : io(options);
+  // Fires on the first connect and on every reconnect: (re)join the session room
+  socket.on('connect', () => {
+    lastSent = null;
+    socket.emit('join', { session_id: sessionId });
+  });
+  socket.on('state', handleFrame);
+  socket.on('ended', sessionExpired);
+  socket.on('error', err => console.error('Socket error:', err));
+}
+
+// Read-only view of another session: a full frame, then binary frames at
+// up to `hz` per second. Each frame is acknowledged so the server can hold
+// back (and skip) frames while we are slow. No inputs and no prediction.
+// `token` is the session's spectate token; the server accepts nothing else
+// from us, so watching can never drive or end the game.
+function spectate(token, hz) {
+  if (typeof io !== 'function') return;
+  spectateToken = token;
+  spectateHz    = hz;
+  spectating    = true;
+  running    = true;
+  resetPrediction();
+  document.getElementById('hud').style.display = 'flex';
+  document.getElementById('hud-p2-controls').style.display = 'none';
+  canvas.style.display = 'block';
+
+  socket = io({ query: { spectate: token } });
+  socket.on('connect', () => socket.emit('spectate', { token, hz }));
+  socket.on('state', spectatorFrame);
+  socket.on('frame', (buf, ack) => {
+    spectatorFrame(buf);
+    if (ack) ack();
+  });
+  socket.on('ended', () => { running = false; });
+  socket.on('error', err => console.error('Socket error:', err));
+  spectateLoop();
+}
+
+// Frames may come slower than we draw (downsampled, or a server stepping
+// sessions below 30 Hz), so players glide from where they were drawn to the
+// newest frame over the time frames have recently taken to arrive.
+let viewFrom = null;       // players as drawn when the newest frame arrived
+let viewTick = 0;          // tick of the frame before it
+let viewAt   = 0;          // when it arrived
+let viewGap  = 1000 / 30;  // smoothed time between frames
+
+function spectatorFrame(data) {
+  const now  = performance.now();
+  const from = gameState && spectatorView(now);
+  const tick = gameState && gameState.tick;
+  handleFrame(data);
+  if (!gameState || gameState.tick === tick) return;
+  if (viewAt) viewGap += (Math.min(now - viewAt, 500) - viewGap) * 0.2;
+  viewFrom = from;
+  viewTick = tick;
+  viewAt   = now;
+}
+
+function spectatorView(ts) {
+  if (!viewFrom) return gameState.players;
+  const k   = Math.min(1, Math.max(0, (ts - viewAt) / viewGap));
+  const out = clonePlayers(gameState.players);
+  for (const [pid, p] of Object.entries(out)) {
+    const a = viewFrom[pid];
+    if (!a || Math.hypot(a.x - p.x, a.y - p.y) > SNAP_DIST) continue;  // respawn: snap
+    p.x = a.x + (p.x - a.x) * k;
+    p.y = a.y + (p.y - a.y) * k;
+  }
+  for (const m of movingRects(gameState.level)) m.x = moverX(m, viewTick + (gameState.tick - viewTick) * k);
+  for (const [pid, p] of Object.entries(out)) p.color = gameState.players[pid].color;
+  return out;
+}
+
+function spectateLoop(ts = 0) {
+  if (!running) return;
+  if (gameState) numPlayers = Object.keys(gameState.players).length;
+  render(ts);
+  requestAnimationFrame(spectateLoop);
+}
+
+// Frees the session on the server; sendBeacon still delivers while the page unloads
+function leaveSession() {
+  running   = false;
+  if (sessionId && !spectating) {
+    navigator.sendBeacon(apiBase + '/api/end_game', JSON.stringify({ session_id: sessionId }));
+  }
+  if (socket) {
+    socket.disconnect();
+    socket = null;
+  }
+  sessionId = null;
+  gameState = null;
+  won       = false;
+}
+
+// The server dropped our session (idle too long or at capacity): start over
+function sessionExpired() {
+  if (!running || won) return;
+  console.warn('Session expired, restarting level');
+  leaveSession();
+  startGame(numPlayers, levelNum);
+}
+
+window.addEventListener('pagehide', leaveSession);
+
 function returnToMenu() {
-    running   = false;
-    sessionId = null;
-    gameState = null;
-    won       = false;
+    leaveSession();
     if (numPlayers === 2 && typeof playDuoSound === 'function') {
       playDuoSound();
     } else if (typeof playSoloSound === 'function') {
@@ -62,10 +206,7 @@ function returnToMenu() {
 }
 
 function goToSoloLevel2() {
-  running   = false;
-  sessionId = null;
-  gameState = null;
-  won       = false;
+  leaveSession();
   if (typeof playSoloSound === 'function') {
     playSoloSound();
   }
@@ -73,10 +214,7 @@ function goToSoloLevel2() {
 }
 
 function goToSoloLevel3() {
-  running   = false;
-  sessionId = null;
-  gameState = null;
-  won       = false;
+  leaveSession();
   if (typeof playSoloSound === 'function') {
     playSoloSound();
   }
@@ -84,10 +222,7 @@ function goToSoloLevel3() {
 }
 
 function goToDuoLevel2() {
-  running   = false;
-  sessionId = null;
-  gameState = null;
-  won       = false;
+  leaveSession();
   if (typeof playDuoSound === 'function') {
     playDuoSound();
   }
@@ -95,10 +230,7 @@ function goToDuoLevel2() {
 }
 
 function goToDuoLevel3() {
-  running   = false;
-  sessionId = null;
-  gameState = null;
-  won       = false;
+  leaveSession();
   if (typeof playDuoSound === 'function') {
     playDuoSound();
   }
@@ -108,6 +240,10 @@ function goToDuoLevel3() {
 // ── Auto-start from URL param ───────────────────────────────────────────────
 window.addEventListener('DOMContentLoaded', () => {
   const params = new URLSearchParams(window.location.search);
+  if (params.get('spectate')) {
+    spectate(params.get('spectate'), parseInt(params.get('hz')) || undefined);
+    return;
+  }
   const mode   = parseInt(params.get('mode'))  || 1;
   const level  = parseInt(params.get('level')) || 1;
   startGame(mode, level);
@@ -133,28 +269,395 @@ function buildInputPayload() {
 }
 
 // ── Server Tick ────────────────────────────────────────────────────────────
+// Socket mode: push the held keys only when they change; the server steps
+// the game on its own clock and pushes frames back.
+function pushInput() {
+  if (!sessionId || won || !socket.connected) return;
+  const inputs = buildInputPayload();
+  const json   = JSON.stringify(inputs);
+  if (json === lastSent) return;
+  lastSent = json;
+  if (encoding === 'binary') {
+    socket.emit('input', { session_id: sessionId, bits: packInputs(inputs), seq: inputSeq });
+  } else {
+    socket.emit('input', { session_id: sessionId, inputs, seq: inputSeq });
+  }
+}
+
+// Polling mode: report held keys and fetch the newest frame via /api/input
 async function tick() {
   if (!sessionId || won) return;
 
   try {
-    const res = await fetch('/api/input', {
+    const since = gameState ? gameState.tick : null;  // ask for a delta on top of this
+    const res = await fetch(apiBase + '/api/input', encoding === 'binary' ? {
+      method:  'POST',
+      headers: { 'Content-Type': 'application/octet-stream' },
+      body:    encodeInputRequest(sessionId, since, inputSeq, packInputs(buildInputPayload()))
+    } : {
       method:  'POST',
       headers: { 'Content-Type': 'application/json' },
-      body:    JSON.stringify({ session_id: sessionId, inputs: buildInputPayload() })
+      body:    JSON.stringify({ session_id: sessionId, inputs: buildInputPayload(), tick: since, seq: inputSeq })
     });
-    const data = await res.json();
-    gameState = data;
-
-    if (data.win) {
-      won = true;
-      if (typeof playWinSound === 'function') playWinSound();
-      document.getElementById('winOverlay').style.display = 'flex';
+    if (res.status === 404) {
+      sessionExpired();
+      return;
     }
+    const binaryReply = (res.headers.get('Content-Type') || '').startsWith('application/octet-stream');
+    handleFrame(binaryReply ? await res.arrayBuffer() : await res.json());
   } catch (err) {
     console.error('Tick error:', err);
   }
 }
 
+// Client clock: send every buffered tick the server has not acknowledged yet.
+// A lost reply just means the same ticks go again; the server skips repeats.
+async function sendBatch() {
+  if (!sessionId || won || batchPending) return;
+  batchPending = true;
+  const batch = outbox.slice(0, MAX_BATCH);
+  const since = gameState ? gameState.tick : null;
+  const seq   = batch.length ? batch[0].seq : inputSeq + 1;
+  try {
+    const res = await fetch(apiBase + '/api/input_batch', encoding === 'binary' ? {
+      method:  'POST',
+      headers: { 'Content-Type': 'application/octet-stream' },
+      body:    encodeBatchRequest(sessionId, since, seq, batch.map(e => packInputs(e.inputs)))
+    } : {
+      method:  'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body:    JSON.stringify({ session_id: sessionId, tick: since, seq, inputs: batch.map(e => e.inputs) })
+    });
+    if (res.status === 404) {
+      sessionExpired();
+      return;
+    }
+    const binaryReply = (res.headers.get('Content-Type') || '').startsWith('application/octet-stream');
+    handleFrame(binaryReply ? await res.arrayBuffer() : await res.json());
+  } catch (err) {
+    console.error('Batch error:', err);
+  } finally {
+    batchPending = false;
+  }
+}
+
+// Full frames carry the whole level; delta frames carry a `base` tick and
+// only player kinematics, moving x positions and flags changed since `base`.
+function handleFrame(data) {
+  if (won) return;
+  if (data instanceof ArrayBuffer) {
+    if (!gameState) {
+      requestResync();
+      return;
+    }
+    data = decodeFrame(data);
+    if (data.tick <= gameState.tick) return;  // stale
+    applyBinaryFrame(data);
+  } else if (data.base === undefined) {
+    gameState = data;
+  } else if (gameState && data.base <= gameState.tick && gameState.tick < data.tick) {
+    applyDelta(data);
+  } else if (gameState && data.tick <= gameState.tick) {
+    return;  // stale reply from an overlapping poll
+  } else {
+    requestResync();
+    return;
+  }
+
+  reconcile(data.ack);
+
+  if (data.win) {
+    won = true;
+    if (typeof playWinSound === 'function') playWinSound();
+    document.getElementById('winOverlay').style.display = 'flex';
+  }
+}
+
+function applyDelta(d) {
+  const lvl = gameState.level;
+  for (const [pid, p] of Object.entries(d.players)) Object.assign(gameState.players[pid], p);
+  for (const [i, x] of Object.entries(d.moving.tiles))           lvl.tiles[i].x           = x;
+  for (const [i, x] of Object.entries(d.moving.pressure_plates)) lvl.pressure_plates[i].x = x;
+
+  const f = d.flags;
+  for (const [i, pl] of Object.entries(f.pressure_plates || {})) Object.assign(lvl.pressure_plates[i], pl);
+  for (const [i, gp] of Object.entries(f.goal_plates || {}))     Object.assign(lvl.goal_plates[i], gp);
+  if (f.goal_plate)                Object.assign(lvl.goal_plate, f.goal_plate);
+  if (f.goal_locked !== undefined) lvl.goal_locked = f.goal_locked;
+  if (f.doors_open  !== undefined) lvl.doors_open  = f.doors_open;
+
+  gameState.tick = d.tick;
+  gameState.win  = d.win;
+}
+
+// ── Binary wire format (mirrors server/wire.py) ──────────────────────────────
+const WIRE_SCALE = 8;  // positions are sent in 1/8 px
+const INPUT_KEYS = ['left', 'right', 'jump'];
+
+function packInputs(inputs) {
+  let bits = 0;
+  ['p1', 'p2'].forEach((pid, i) => {
+    INPUT_KEYS.forEach((key, k) => {
+      if (inputs[pid] && inputs[pid][key]) bits |= 1 << (3 * i + k);
+    });
+  });
+  return bits;
+}
+
+function encodeInputRequest(id, since, seq, bits) {
+  const buf  = new ArrayBuffer(17);
+  const view = new DataView(buf);
+  for (let i = 0; i < 8; i++) view.setUint8(i, i < id.length ? id.charCodeAt(i) : 0);
+  view.setInt32(8, since === null ? -1 : since, true);
+  view.setInt32(12, seq === null ? -1 : seq, true);
+  view.setUint8(16, bits);
+  return buf;
+}
+
+function encodeBatchRequest(id, since, seq, bitsList) {
+  const buf  = new ArrayBuffer(16 + bitsList.length);
+  const view = new DataView(buf);
+  for (let i = 0; i < 8; i++) view.setUint8(i, i < id.length ? id.charCodeAt(i) : 0);
+  view.setInt32(8, since === null ? -1 : since, true);
+  view.setInt32(12, seq, true);
+  bitsList.forEach((bits, i) => view.setUint8(16 + i, bits));
+  return buf;
+}
+
+function decodeFrame(buf) {
+  const view = new DataView(buf);
+  const status = view.getUint8(1);
+  const ack = view.getInt32(6, true);
+  const frame = {
+    tick:        view.getUint32(2, true),
+    ack:         ack >= 0 ? ack : null,
+    win:         (status & 1) !== 0,
+    goal_locked: (status & 2) !== 0,
+    doors_open:  (status & 4) !== 0,
+    players:     {},
+    moving:      [],
+    plates:      []
+  };
+  const nPlayers = view.getUint8(10), nMoving = view.getUint8(11), nPlates = view.getUint8(12);
+  let o = 13;
+  for (let i = 0; i < nPlayers; i++, o += 9) {
+    frame.players[`p${i + 1}`] = {
+      x:  view.getInt16(o,     true) / WIRE_SCALE,
+      y:  view.getInt16(o + 2, true) / WIRE_SCALE,
+      vx: view.getInt16(o + 4, true) / WIRE_SCALE,
+      vy: view.getInt16(o + 6, true) / WIRE_SCALE,
+      on_ground: view.getUint8(o + 8) !== 0
+    };
+  }
+  for (let i = 0; i < nMoving; i++, o += 2) frame.moving.push(view.getInt16(o, true) / WIRE_SCALE);
+  for (let i = 0; i < nPlates; i++) {
+    const byte = view.getUint8(o + (i >> 2)), shift = (i & 3) * 2;
+    frame.plates.push([(byte >> shift & 1) !== 0, (byte >> (shift + 1) & 1) !== 0]);
+  }
+  return frame;
+}
+
+// Binary frames carry every flag, so they apply on top of any earlier frame
+function applyBinaryFrame(f) {
+  const lvl = gameState.level;
+  for (const [pid, p] of Object.entries(f.players)) Object.assign(gameState.players[pid], p);
+  movingRects(lvl).forEach((m, i) => { m.x = f.moving[i]; });
+  allPlates(lvl).forEach((pl, i) => { [pl.active, pl.triggered] = f.plates[i]; });
+  lvl.goal_locked = f.goal_locked;
+  lvl.doors_open  = f.doors_open;
+  gameState.tick  = f.tick;
+  gameState.win   = f.win;
+}
+
+// Same order as the server's template.moving_refs: moving tiles, then moving plates
+function movingRects(lvl) {
+  return lvl.tiles.filter(t => t.moving).concat(lvl.pressure_plates.filter(p => p.moving));
+}
+
+// Same order as the server's template.plates: door plates, goal plate, goal plates
+function allPlates(lvl) {
+  return lvl.pressure_plates.concat(lvl.goal_plate ? [lvl.goal_plate] : [], lvl.goal_plates);
+}
+
+function requestResync() {
+  if (spectating) {
+    socket.emit('spectate', { token: spectateToken, hz: spectateHz });  // subscribing again starts with a full frame
+  } else if (socket) {
+    socket.emit('resync', { session_id: sessionId });
+  } else {
+    gameState = null;  // next poll omits `tick` and gets a full frame
+  }
+}
+
+// ── Client-side prediction ─────────────────────────────────────────────────
+// The server is authoritative but a round trip behind. We run the same
+// physics locally (constants and collision rules mirror server/game_state.py),
+// numbering every local tick. Inputs carry that number as `seq` and frames
+// echo the tick they correspond to as `ack`; on each frame we restart from
+// the server's players and replay the inputs it has not seen yet. Plates and
+// doors are never predicted, only taken from the server.
+const GRAVITY     = 0.6;
+const SPEED       = 4;
+const JUMP_FORCE  = -13;
+const STEP_HEIGHT = 10;
+const PLAYER_W    = 32;
+const PLAYER_H    = 48;
+const TICK_MS     = 1000 / 30;  // server tick rate
+const SNAP_DIST   = 64;         // corrections bigger than this (respawns) are not smoothed
+const MAX_PENDING = 90;         // ~3 s of unacknowledged ticks before we stop predicting
+
+let inputSeq    = 0;     // local tick counter
+let pending     = [];    // [{ seq, inputs }] not yet acknowledged by the server
+let predicted   = null;  // { tick, players } after every pending input
+let previous    = null;  // predicted players one tick earlier, for interpolation
+let correction  = {};    // pid -> { x, y } render offset that decays after a correction
+let lastPredict = 0;     // timestamp of the last local tick
+
+function resetPrediction() {
+  inputSeq    = 0;
+  pending     = [];
+  predicted   = null;
+  previous    = null;
+  correction  = {};
+  lastPredict = 0;
+}
+
+function clonePlayers(players) {
+  const out = {};
+  for (const [pid, p] of Object.entries(players)) {
+    out[pid] = { x: p.x, y: p.y, vx: p.vx, vy: p.vy, on_ground: p.on_ground };
+  }
+  return out;
+}
+
+function moverX(rect, tick) {
+  return tick === 0 ? rect.x : rect.move_center_x + rect.move_amp * Math.sin(tick * rect.move_speed);
+}
+
+// Solid rectangles at `tick`, in the server's collider order
+function predictionColliders(lvl, tick) {
+  const solids = [];
+  for (const t of lvl.tiles) solids.push(t.moving ? { ...t, x: moverX(t, tick) } : t);
+  if (!lvl.doors_open) solids.push(...(lvl.doors || []));
+  for (const pl of allPlates(lvl)) {
+    if (!pl.triggered) solids.push(pl.moving ? { ...pl, x: moverX(pl, tick) } : pl);
+  }
+  if (lvl.goal_locked && lvl.goal_door) solids.push(lvl.goal_door);
+  return solids;
+}
+
+function overlaps(p, t) {
+  return p.x < t.x + t.w && p.x + PLAYER_W > t.x && p.y < t.y + t.h && p.y + PLAYER_H > t.y;
+}
+
+function resolveX(p, solids) {
+  for (const t of solids) {
+    if (!overlaps(p, t)) continue;
+    const feetOverlap = (p.y + PLAYER_H) - t.y;
+    if (feetOverlap > 0 && feetOverlap <= STEP_HEIGHT) continue;  // step-up, Y resolves it
+    if (p.vx > 0)      p.x = t.x - PLAYER_W;
+    else if (p.vx < 0) p.x = t.x + t.w;
+  }
+}
+
+function resolveY(p, solids) {
+  p.on_ground = false;
+  for (const t of solids) {
+    if (!overlaps(p, t)) continue;
+    if (p.vy >= 0) {
+      p.y = t.y - PLAYER_H;
+      p.vy = 0;
+      p.on_ground = true;
+    } else {
+      p.y = t.y + t.h;
+      p.vy = 0;
+    }
+  }
+}
+
+// One server tick: apply_input() for every player, then update()
+function stepPredicted(inputs) {
+  const solids = predictionColliders(gameState.level, predicted.tick);
+  for (const [pid, p] of Object.entries(predicted.players)) {
+    const inp = inputs[pid] || {};
+    p.vx = 0;
+    if (inp.left)  p.vx = -SPEED;
+    if (inp.right) p.vx = SPEED;
+    if (inp.jump && p.on_ground) {
+      p.vy = JUMP_FORCE;
+      p.on_ground = false;
+    }
+  }
+  for (const p of Object.values(predicted.players)) {
+    p.vy = Math.min(p.vy + GRAVITY, 20);
+    p.x += p.vx;
+    resolveX(p, solids);
+    p.y += p.vy;
+    resolveY(p, solids);
+  }
+  predicted.tick += 1;
+}
+
+// Runs one local tick: sample input, send it and predict its effect
+function predictTick() {
+  inputSeq += 1;
+  const inputs = buildInputPayload();
+  if (socket) pushInput();
+  if (clientClock) outbox.push({ seq: inputSeq, inputs });
+  if (!predicted || pending.length >= MAX_PENDING) return;
+  pending.push({ seq: inputSeq, inputs });
+  previous = clonePlayers(predicted.players);
+  stepPredicted(inputs);
+}
+
+// Called with every accepted server frame
+function reconcile(ack) {
+  if (typeof ack !== 'number') {
+    predicted = null;  // server does not acknowledge our ticks: show its frames as they are
+    return;
+  }
+  pending = pending.filter(e => e.seq > ack);
+  outbox  = outbox.filter(e => e.seq > ack);
+  const before = predicted && rendered(predicted.players);
+  predicted = { tick: gameState.tick, players: clonePlayers(gameState.players) };
+  for (const e of pending) stepPredicted(e.inputs);
+
+  // Keep drawing where we were and let the offset decay instead of jumping
+  for (const [pid, p] of Object.entries(predicted.players)) {
+    const old = before && before[pid];
+    const dx = old ? old.x - p.x : 0;
+    const dy = old ? old.y - p.y : 0;
+    correction[pid] = Math.hypot(dx, dy) > SNAP_DIST ? { x: 0, y: 0 } : { x: dx, y: dy };
+  }
+  previous = null;
+}
+
+// Predicted players with their correction offset applied
+function rendered(players) {
+  const out = clonePlayers(players);
+  for (const [pid, p] of Object.entries(out)) {
+    const c = correction[pid];
+    if (c) { p.x += c.x; p.y += c.y; }
+  }
+  return out;
+}
+
+// What render() draws: interpolated between the last two local ticks
+function predictedView(frac) {
+  for (const c of Object.values(correction)) { c.x *= 0.85; c.y *= 0.85; }
+  const view = rendered(predicted.players);
+  for (const [pid, p] of Object.entries(view)) {
+    const prev = previous && previous[pid];
+    if (!prev) continue;
+    const cur = predicted.players[pid];
+    p.x -= (cur.x - prev.x) * (1 - frac);
+    p.y -= (cur.y - prev.y) * (1 - frac);
+  }
+  for (const m of movingRects(gameState.level)) m.x = moverX(m, predicted.tick - 1 + frac);
+  for (const [pid, p] of Object.entries(view)) p.color = gameState.players[pid].color;
+  return view;
+}
+
 // ── Rendering ──────────────────────────────────────────────────────────────
 const TILE_COLOR          = '#4a90d9';
 const TILE_SHADOW         = '#2a5fa8';
@@ -303,9 +806,6 @@ function drawGoalPlate(plate) {
 }
 
 function drawPlayer(p, pid) {
-  const PLAYER_W = 32;
-  const PLAYER_H = 48;
-
   // Body
   ctx.fillStyle = p.color;
   ctx.beginPath();
@@ -341,10 +841,13 @@ function drawPlayer(p, pid) {
   ctx.fillText(label, p.x + PLAYER_W / 2 - tw / 2, p.y - 10);
 }
 
-function render() {
+function render(ts = 0) {
   drawBackground();
   if (!gameState) return;
 
+  const frac    = Math.min(1, Math.max(0, (ts - lastPredict) / TICK_MS));
+  const players = predicted ? predictedView(frac) : spectating ? spectatorView(ts) : gameState.players;
+
   const lvl = gameState.level;
 
   // Draw lava floor for lava-themed levels
@@ -383,7 +886,7 @@ function render() {
   }
 
   // Draw players
-  for (const [pid, p] of Object.entries(gameState.players)) drawPlayer(p, pid);
+  for (const [pid, p] of Object.entries(players)) drawPlayer(p, pid);
 
   // Contextual hint text
   if (!lvl.doors_open) {
@@ -404,18 +907,24 @@ function render() {
 }
 
 // ── Game Loop ──────────────────────────────────────────────────────────────
-// We run rendering at ~60fps and server ticks at ~30fps
-let lastTick = 0;
-
+// We run rendering at ~60fps and local ticks at the server's 30/sec. Each
+// local tick predicts one step; over the socket it also pushes input changes,
+// on our own clock it batches inputs, otherwise we poll /api/input every tick.
 function gameLoop(ts = 0) {
   if (!running) return;
 
-  render();
-
-  if (ts - lastTick > 33) {  // ~30 ticks/sec
-    tick();
-    lastTick = ts;
+  if (ts - lastPredict > 10 * TICK_MS) lastPredict = ts - TICK_MS;  // tab was in the background
+  while (ts - lastPredict >= TICK_MS) {
+    predictTick();
+    if (clientClock) {
+      if (inputSeq % BATCH_TICKS === 0) sendBatch();
+    } else if (!socket) {
+      tick();
+    }
+    lastPredict += TICK_MS;
   }
 
+  render(ts);
+
   requestAnimationFrame(gameLoop);
 }
\ No newline at end of file
@@ -22,74 +22,418 @@
 # app.config['SESSION_PERMANENT'] = False
 
 
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit, join_room
-from game_state import GameState
+from flask import Flask, Response, jsonify, request
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from werkzeug.serving import WSGIRequestHandler
+from game_state import COLLISIONS, GameState
+from scheduler import TickScheduler, clean_inputs
+from session_store import SessionStore
+from spectators import Spectators
+import assets
+import batch_engine
+import levels
+import metrics
+import shards
+import wire
+import os
+import secrets
+import socket
 import uuid
 
 app = Flask(__name__, static_folder='../client', static_url_path='', template_folder='../client')
 app.config['SECRET_KEY'] = 'secret!'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-sessions = {}  # session_id -> GameState
+levels.load_all()  # validate and compile every level file before serving
+
+SERVER_TICK_HZ = 30  # physics constants are tuned per tick at the client's old ~33 ms cadence
+STEP_HZ        = int(os.environ.get('STEP_HZ', SERVER_TICK_HZ))  # session steps per second; below 30 a step covers several ticks
+COLLISION      = os.environ.get('COLLISION', 'discrete')     # 'swept' lets one step cover several ticks safely
+SESSION_TTL    = int(os.environ.get('SESSION_TTL', 600))     # seconds without input before a session is dropped
+MAX_SESSIONS   = int(os.environ.get('MAX_SESSIONS', 5000))   # least recently used sessions are dropped beyond this
+SWEEP_INTERVAL = 30                                          # seconds between idle sweeps
+BATCH_PHYSICS  = os.environ.get('BATCH_PHYSICS') == '1'      # step sessions with the numpy engine
+MAX_BATCH      = 90                                          # most ticks one /api/input_batch may carry
+# METRICS=1 turns on the latency histograms at /metrics (see metrics.py)
+HOST           = os.environ.get('HOST', '0.0.0.0')
+PORT           = int(os.environ.get('PORT', 8080))
+SHARD          = int(os.environ.get('SHARD', 0))             # set by shards.py: this worker's index...
+SHARDS         = int(os.environ.get('SHARDS', 1))            # ...and how many workers share the sessions
+DIRECT         = os.environ.get('DIRECT') == '1'             # shards.py --direct: clients reach this worker's PORT
+
+if COLLISION not in COLLISIONS:
+    raise SystemExit(f"COLLISION must be one of: {', '.join(COLLISIONS)}")
+if not 1 <= STEP_HZ <= SERVER_TICK_HZ:
+    raise SystemExit(f'STEP_HZ must be between 1 and {SERVER_TICK_HZ}')
+
+def _on_session_end(session_id, reason):
+    """Drops everything else kept per session and tells anyone still watching."""
+    scheduler.forget(session_id)
+    last_sent.pop(session_id, None)
+    binary.discard(session_id)
+    if viewers.pop(session_id, None):
+        socketio.emit('ended', {'session_id': session_id, 'reason': reason}, to=session_id)
+        socketio.close_room(session_id)
+    for sid in spectators.end(session_id):
+        socketio.emit('ended', {'reason': reason}, to=sid)  # spectators never learn the session_id
+
+sessions  = SessionStore(ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, on_end=_on_session_end)
+viewers   = {}  # session_id -> set of Socket.IO sids joined to that session's room
+last_sent = {}  # session_id -> tick of the last frame pushed to that room
+binary    = set()  # session_ids that negotiated the binary wire format (wire.py)
+spectators = Spectators(
+    lambda sid, frame, on_ack: socketio.emit('frame', frame, to=sid, callback=on_ack),
+    rate=SERVER_TICK_HZ)
+
+def _publish(session_ids):
+    """Pushes the newest frame to every session room that has someone in it."""
+    for session_id in session_ids:
+        if session_id in spectators:
+            _broadcast(session_id)
+        if viewers.get(session_id):
+            with scheduler.lock:
+                state = sessions.get(session_id)
+                if state is None:
+                    continue
+                result = _frame(state, last_sent.get(session_id))
+                last_sent[session_id] = state.tick
+            socketio.emit('state', result, to=session_id)
+
+def _broadcast(session_id):
+    """Encodes a session's frame once for all of its spectators that are due one."""
+    with scheduler.lock:
+        state = sessions.get(session_id)
+        if state is None or not spectators.due(session_id, state.tick):
+            return
+        tick, frame = state.tick, wire.encode_frame(state, state.check_win())
+    spectators.publish(session_id, tick, frame)
+
+# The numpy engine only implements discrete collisions
+scheduler = TickScheduler(socketio, sessions, rate=STEP_HZ, tick_rate=SERVER_TICK_HZ, on_tick=_publish,
+                          batch=BATCH_PHYSICS and COLLISION == 'discrete' and batch_engine.available())
+
+pages = assets.Assets(app.static_folder)  # hashed, cached client files (see assets.py)
+
+@app.route('/assets/<path:name>')
+def asset(name):
+    return pages.asset(name)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return pages.page('index.html')
 
 @app.route('/solo_level_1')
 def solo_level_1():
-    return render_template('solo_level_1.html')
+    return pages.page('solo_level_1.html')
 
 @app.route('/solo_level_2')
 def solo_level_2():
-    return render_template('solo_level_2.html')
+    return pages.page('solo_level_2.html')
 
 @app.route('/solo_level_3')
 def solo_level_3():
-    return render_template('solo_level_3.html')
+    return pages.page('solo_level_3.html')
 
 @app.route('/duo_level_1')
 def duo_level_1():
-    return render_template('duo_level_1.html')
+    return pages.page('duo_level_1.html')
 
 @app.route('/duo_level_2')
 def duo_level_2():
-    return render_template('duo_level_2.html')
+    return pages.page('duo_level_2.html')
 
 @app.route('/duo_level_3')
 def duo_level_3():
-    return render_template('duo_level_3.html')
+    return pages.page('duo_level_3.html')
+
+@app.route('/thank_you.html')
+def thank_you():
+    return pages.page('thank_you.html')
 
 @app.route('/api/start_game', methods=['POST'])
 def start_game():
-    data = request.get_json()
-    mode  = data.get('mode', 1)   # 1 or 2 players
-    level = data.get('level', 1)  # level number
-    session_id = str(uuid.uuid4())[:8].upper()
-    sessions[session_id] = GameState(session_id, num_players=mode, level_num=level)
-    return jsonify({'session_id': session_id})
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Malformed request'}), 400
+    try:
+        mode  = int(data.get('mode', 1))   # 1 or 2 players
+        level = int(data.get('level', 1))  # level number; unknown ones fall back to level 1
+    except (TypeError, ValueError):
+        return jsonify({'error': 'mode and level must be numbers'}), 400
+    if mode not in (1, 2) or level < 1:
+        return jsonify({'error': 'mode must be 1 or 2 and level at least 1'}), 400
+    encoding = data.get('encoding', 'json')
+    if encoding not in wire.ENCODINGS:
+        encoding = 'json'
+    session_id = _new_session_id()
+    sessions.add(session_id, GameState(session_id, num_players=mode, level_num=level, collision=COLLISION))
+    if encoding == 'binary':
+        binary.add(session_id)
+    # 'client': the session only advances through /api/input_batch
+    clock = 'client' if data.get('clock') == 'client' else 'server'
+    if clock == 'client':
+        scheduler.clock_by_client(session_id)
+    scheduler.start()
+    sessions.start_sweeper(socketio, SWEEP_INTERVAL)
+    spectate_token = _new_spectate_token()
+    spectators.allow(session_id, spectate_token)
+    reply = {'session_id': session_id, 'encoding': encoding, 'clock': clock,
+             'spectate_token': spectate_token}  # share this, never the session_id
+    if DIRECT:
+        reply['port'] = PORT  # the page came through the router; play on this worker's port
+    return jsonify(reply)
+
+@app.after_request
+def allow_direct(resp):
+    # Behind shards.py --direct the page's origin is the router, so game
+    # requests to this worker are cross-origin (Socket.IO allows any origin)
+    if DIRECT and request.path.startswith('/api/'):
+        resp.headers['Access-Control-Allow-Origin'] = '*'
+        resp.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        resp.headers['Access-Control-Max-Age'] = '600'
+    return resp
+
+def _new_session_id():
+    # Behind shards.py the router finds a session's worker from its ID alone
+    while True:
+        session_id = str(uuid.uuid4())[:8].upper()
+        if SHARDS == 1 or shards.owner(session_id, SHARDS) == SHARD:
+            return session_id
+
+def _new_spectate_token():
+    # 16 characters, so it can never pass for an 8-character session_id;
+    # routed like one (shards.py)
+    while True:
+        token = secrets.token_urlsafe(12)
+        if SHARDS == 1 or shards.owner(token, SHARDS) == SHARD:
+            return token
+
+@app.route('/api/end_game', methods=['POST'])
+def end_game():
+    # Sent with navigator.sendBeacon when a page is left, so the body may
+    # arrive without a JSON content type.
+    data = request.get_json(force=True, silent=True) or {}
+    ended = sessions.end(data.get('session_id'))
+    return jsonify({'ended': ended})
 
 @app.route('/api/input', methods=['POST'])
 def handle_input():
-    data = request.get_json()
-    session_id = data.get('session_id')
-    inputs = data.get('inputs')  # dict: { "p1": {...}, "p2": {...} }
+    bits = None
+    if request.mimetype == wire.CONTENT_TYPE:
+        try:
+            session_id, since, seq, bits = wire.decode_input_request(request.get_data())
+        except ValueError:
+            return jsonify({'error': 'Malformed input'}), 400
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Malformed input'}), 400
+        session_id = data.get('session_id')
+        inputs = data.get('inputs')  # dict: { "p1": {...}, "p2": {...} }
+        since  = data.get('tick')    # tick of the client's current frame; omit for a full frame
+        seq    = data.get('seq')     # client tick of these inputs, if it predicts locally
 
-    if session_id not in sessions:
+    if not sessions.touch(session_id):
         return jsonify({'error': 'Session not found'}), 404
+    if bits is not None:
+        inputs = wire.unpack_inputs(bits, sessions[session_id].num_players)
 
-    state = sessions[session_id]
-    for pid, inp in inputs.items():
-        state.apply_input(pid, inp)
-    state.update()
+    # The scheduler steps the session; we only record the keys and report back
+    if not scheduler.push_input(session_id, inputs, seq):
+        return jsonify({'error': 'Malformed input'}), 400
+    with scheduler.lock:
+        result = _frame(sessions[session_id], since)
+    if isinstance(result, bytes):
+        return Response(result, mimetype=wire.CONTENT_TYPE)
+    return jsonify(result)
 
-    result = state.serialize()
-    result['win'] = state.check_win()
+@app.route('/api/input_batch', methods=['POST'])
+def handle_input_batch():
+    """Applies buffered per-tick inputs of a client-clocked session and returns one frame."""
+    if request.mimetype == wire.CONTENT_TYPE:
+        try:
+            session_id, since, seq, bits = wire.decode_batch_request(request.get_data())
+        except ValueError:
+            return jsonify({'error': 'Malformed input'}), 400
+        batch = None
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Malformed input'}), 400
+        session_id = data.get('session_id')
+        since = data.get('tick')    # tick of the client's current frame; omit for a full frame
+        seq   = data.get('seq')     # client tick of batch[0]; the rest follow one per tick
+        batch = data.get('inputs')  # list of { "p1": {...}, "p2": {...} }, one per tick
+        bits  = None
+        if not isinstance(seq, int) or not isinstance(batch, list):
+            return jsonify({'error': 'Malformed input'}), 400
+        batch = [clean_inputs(inputs) for inputs in batch]
+        if None in batch:
+            return jsonify({'error': 'Malformed input'}), 400
+
+    if not sessions.touch(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    if session_id not in scheduler.client_clocked:
+        return jsonify({'error': 'Session is not client-clocked'}), 409
+    if len(batch if batch is not None else bits) > MAX_BATCH:
+        return jsonify({'error': f'At most {MAX_BATCH} ticks per batch'}), 413
+    if batch is None:
+        num_players = sessions[session_id].num_players
+        batch = [wire.unpack_inputs(b, num_players) for b in bits]
+
+    scheduler.step_batch(session_id, seq, batch)
+    if session_id in spectators:
+        _broadcast(session_id)
+    with scheduler.lock:
+        result = _frame(sessions[session_id], since)
+    if isinstance(result, bytes):
+        return Response(result, mimetype=wire.CONTENT_TYPE)
     return jsonify(result)
 
+@app.route('/api/stats')
+def stats():
+    return jsonify({'sessions': sessions.stats(), 'scheduler': scheduler.stats(),
+                    'spectators': spectators.stats(), 'shard': {'index': SHARD, 'count': SHARDS}})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if not metrics.enabled:
+        return 'metrics are disabled, start the server with METRICS=1\n', 404
+    body = metrics.render({
+        'puzzle_live_sessions': ('Game sessions currently held', len(sessions)),
+        'puzzle_ticks_per_second': ('Scheduler ticks per second since the last scrape',
+                                    metrics.rate('ticks', scheduler.ticks)),
+        'puzzle_session_steps_per_second': ('Session updates per second since the last scrape',
+                                            metrics.rate('session_steps', scheduler.session_steps)),
+        'puzzle_max_tick_ms': ('Slowest scheduler tick so far', scheduler.max_tick_ms),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+if metrics.enabled:
+    # Only swapped in when enabled, so the default build pays nothing
+    metrics.instrument(GameState, app)
+    app.view_functions['handle_input'] = metrics.timed('api_input', handle_input)
+
+def _frame(state, since=None):
+    """Full frame when `since` is unknown, otherwise a delta on top of it.
+
+    Binary sessions get their deltas as wire.encode_frame() bytes. `ack` is
+    the client tick the frame corresponds to, for client-side prediction.
+    """
+    ack = scheduler.acks.get(state.session_id)
+    if isinstance(since, int) and 0 <= since <= state.tick:
+        if state.session_id in binary:
+            return wire.encode_frame(state, state.check_win(), ack)
+        result = state.serialize_delta(since)
+    else:
+        result = state.serialize()
+    result['win'] = state.check_win()
+    result['ack'] = ack
+    return result
+
+# ── Socket.IO channel ──────────────────────────────────────────────────────
+# One room per session_id. The client pushes input changes, the scheduler
+# steps the game on its own clock and _publish() pushes frames to the room.
+# Spectators are not in the room; see spectators.py.
+
+@socketio.on('join')
+def on_join(data):
+    session_id = (data or {}).get('session_id')
+    if not sessions.touch(session_id):
+        emit('error', {'error': 'Session not found'})
+        return
+    join_room(session_id)
+    viewers.setdefault(session_id, set()).add(request.sid)
+    with scheduler.lock:
+        result = _frame(sessions[session_id])
+    emit('state', result)
+
+@socketio.on('resync')
+def on_resync(data):
+    """A client noticed a gap in frame ticks: send it a fresh full frame."""
+    session_id = (data or {}).get('session_id')
+    if session_id not in sessions:
+        emit('error', {'error': 'Session not found'})
+        return
+    with scheduler.lock:
+        result = _frame(sessions[session_id])
+    emit('state', result)
+
+@socketio.on('spectate')
+def on_spectate(data):
+    """Read-only subscription: a full frame now, then binary 'frame' events.
+
+    Takes the session's spectate token, not its session_id, so a shared
+    link cannot be used to play or end the game. The client acknowledges
+    each 'frame' (Socket.IO ack); while it is behind, older frames are
+    skipped. `hz` lowers the rate below the tick rate. Watching does not
+    keep the session alive.
+    """
+    data = data or {}
+    session_id = spectators.session_for(data.get('token'))
+    if session_id not in sessions:
+        emit('error', {'error': 'Session not found'})
+        return
+    with scheduler.lock:
+        result = _frame(sessions[session_id])
+    result['ack'] = None  # the players' client tick means nothing to a spectator
+    emit('state', result)
+    spectators.subscribe(session_id, request.sid, data.get('hz'))
+    spectators.start(socketio.start_background_task)
+
+@socketio.on('unspectate')
+def on_unspectate(data=None):
+    spectators.unsubscribe(request.sid)
+
+@socketio.on('input')
+def on_input(data):
+    data = data or {}
+    session_id = data.get('session_id')
+    if not sessions.touch(session_id):
+        emit('error', {'error': 'Session not found'})
+        return
+    inputs = data.get('inputs')
+    if 'bits' in data:
+        if not isinstance(data['bits'], int):
+            emit('error', {'error': 'Malformed input'})
+            return
+        inputs = wire.unpack_inputs(data['bits'], sessions[session_id].num_players)
+    if not scheduler.push_input(session_id, inputs, data.get('seq')):
+        emit('error', {'error': 'Malformed input'})
+
+@socketio.on('end_session')
+def on_end_session(data):
+    sessions.end((data or {}).get('session_id'))
+
+@socketio.on('leave')
+def on_leave(data):
+    session_id = (data or {}).get('session_id')
+    leave_room(session_id)
+    viewers.get(session_id, set()).discard(request.sid)
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    for room in viewers.values():
+        room.discard(request.sid)
+    spectators.unsubscribe(request.sid)
+
+class NoDelayHandler(WSGIRequestHandler):
+    """Turns off Nagle on every connection.
+
+    Websocket frames and acks are a few dozen bytes. With Nagle on, each one
+    waits for the peer's delayed ACK of the previous one (about 40 ms), which
+    is longer than a tick.
+    """
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=8080, debug=True)
+    # Workers under shards.py have no terminal (Werkzeug refuses that unless
+    # allowed) and must not fork a reloader of their own
+    worker = 'SHARDS' in os.environ
+    socketio.run(app, host=HOST, port=PORT, debug=not worker, allow_unsafe_werkzeug=worker,
+                 request_handler=NoDelayHandler)
 
 #  Add page for choosing single or multiplayer mode, and then redirect to game page with session id in URL.
 # @app.route('/choose_mode')
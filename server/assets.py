@@ -0,0 +1,157 @@
+"""Static files with content-hashed URLs, long-lived caching and cached pages.
+
+Every file under client/ is served at /assets/<name>.<hash>.<ext>, with a
+hash of its final bytes, as immutable for a year. Pages, stylesheets and
+scripts have their references to other client files rewritten to those
+URLs, so a browser only downloads a file again after it changed. The HTML
+pages themselves keep their URLs; they are rendered once, held in memory
+and sent with an ETag and no-cache, so a repeat visit costs one 304.
+
+Text files are kept gzipped (and brotli-compressed when the brotli module
+is installed) next to the original and sent to clients that accept it.
+Range requests, which browsers make for audio, get a 206 of the
+uncompressed bytes. The original, unhashed paths are still served by
+Flask's static route.
+
+When the app runs with debug on, the files are checked for changes on
+every page request, so edits show up on reload without a restart.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone is fine
+    brotli = None
+
+PREFIX = '/assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'  # cache, but ask (cheaply, with the ETag) before every use
+REWRITE = ('.html', '.css', '.js')  # files whose references to other files are rewritten
+COMPRESS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS = 512  # bytes; smaller files are not worth the header overhead
+
+
+class Variant:
+    """One file ready to send: bytes, their ETag, and compressed forms."""
+
+    __slots__ = ('data', 'etag', 'mimetype', 'encoded')
+
+    def __init__(self, data, mimetype):
+        self.data = data
+        self.etag = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetype
+        self.encoded = {}  # content-encoding -> bytes, only when smaller
+        if mimetype.startswith(COMPRESS) and len(data) >= MIN_COMPRESS:
+            candidates = {'gzip': gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                candidates['br'] = brotli.compress(data)
+            for encoding, packed in candidates.items():
+                if len(packed) < len(data) * 0.9:
+                    self.encoded[encoding] = packed
+
+    def response(self, cache_control):
+        """Response for the current request, honouring Accept-Encoding, If-None-Match and Range."""
+        data, etag, encoding = self.data, self.etag, None
+        if 'Range' not in request.headers:
+            for name in ('br', 'gzip'):
+                if name in self.encoded and request.accept_encodings[name]:
+                    data, etag, encoding = self.encoded[name], f'{self.etag}-{name}', name
+                    break
+        resp = Response(data, mimetype=self.mimetype)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = cache_control
+        if self.encoded:
+            resp.vary.add('Accept-Encoding')
+        if encoding:
+            resp.content_encoding = encoding
+        return resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+
+class Assets:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self._stamp = None
+        self.build()
+
+    def build(self):
+        """Hashes every file, rewrites references and renders the pages."""
+        files = {}
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(folder, name)
+                files[os.path.relpath(path, self.root).replace(os.sep, '/')] = path
+        # Files that refer to nothing are hashed first, so the files that
+        # refer to them can be rewritten before they are hashed in turn.
+        # Pages come last and keep their own URLs.
+        order = sorted(files, key=lambda rel: (rel.endswith('.html'), rel.endswith(REWRITE), rel))
+        urls = {}    # relative path -> hashed URL
+        assets = {}  # hashed path (the URL without PREFIX) -> Variant
+        pages = {}   # relative path of an .html file -> Variant
+        for rel in order:
+            with open(files[rel], 'rb') as f:
+                data = f.read()
+            if rel.endswith(REWRITE):
+                data = self._rewrite(data, urls)
+            variant = Variant(data, mimetypes.guess_type(rel)[0] or 'application/octet-stream')
+            if rel.endswith('.html'):
+                pages[rel] = variant
+                continue
+            base, ext = os.path.splitext(rel)
+            hashed = f'{base}.{variant.etag[:10]}{ext}'
+            assets[hashed] = variant
+            urls[rel] = PREFIX + hashed
+        self.urls, self.assets, self.pages = urls, assets, pages
+        self._stamp = self._scan()
+
+    @staticmethod
+    def _rewrite(data, urls):
+        # Longest paths first, so 'js/main.js' is never half-replaced by 'main.js'
+        text = data.decode('utf-8')
+        for rel in sorted(urls, key=len, reverse=True):
+            for quote in ('"', "'", '('):
+                close = ')' if quote == '(' else quote
+                text = text.replace(f'{quote}{rel}{close}', f'{quote}{urls[rel]}{close}')
+        return text.encode('utf-8')
+
+    def _scan(self):
+        stamp = []
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                st = os.stat(os.path.join(folder, name))
+                stamp.append((folder, name, st.st_mtime_ns, st.st_size))
+        return sorted(stamp)
+
+    def url(self, rel):
+        """Hashed URL of a client file, e.g. url('style.css')."""
+        return self.urls[rel]
+
+    def asset(self, hashed):
+        variant = self.assets.get(hashed)
+        if variant is None:
+            abort(404)
+        return variant.response(IMMUTABLE)
+
+    def page(self, rel):
+        if current_app.debug:
+            with self.lock:
+                if self._scan() != self._stamp:
+                    self.build()
+        variant = self.pages.get(rel)
+        if variant is None:
+            abort(404)
+        return variant.response(REVALIDATE)
+
+    def stats(self):
+        return {
+            'files': len(self.assets),
+            'bytes': sum(len(v.data) for v in self.assets.values()),
+            'compressed': sum(1 for v in self.assets.values() if v.encoded),
+            'brotli': brotli is not None,
+        }
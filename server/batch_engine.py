@@ -0,0 +1,297 @@
+"""Optional NumPy physics engine that steps many sessions of one level at once.
+
+BatchEngine keeps every player of every session as struct-of-arrays
+(x, y, vx, vy, on_ground) and runs gravity, integration, collision, plate
+and win checks as vectorized operations, one pass per collider or plate
+instead of one Python call per player per tile. It reproduces
+GameState.update() exactly; run `python batch_engine.py` to check that
+against the scalar path on every level.
+
+NumPy is not required to run the game. Without it, `available()` is False
+and the scheduler keeps using the scalar GameState.update().
+"""
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from game_state import GRAVITY, SPEED, JUMP_FORCE, PLAYER_W, PLAYER_H, STEP_HEIGHT, GameState
+from levels import ALWAYS, DOORS_CLOSED, GOAL_LOCKED
+
+TERMINAL_VY = 20
+
+
+def available():
+    return np is not None
+
+
+class BatchEngine:
+    """Struct-of-arrays physics for sessions sharing one LevelTemplate and player count.
+
+    Usage per tick: load(states), apply_inputs(inputs), step(), store(states).
+    Arrays are shaped (sessions, players) for kinematics and (sessions, n)
+    for moving x positions and plate flags.
+    """
+
+    def __init__(self, template, num_players):
+        if np is None:
+            raise RuntimeError('BatchEngine needs numpy')
+        self.template = template
+        self.num_players = num_players
+        self.pids = [f'p{i+1}' for i in range(num_players)]
+
+        spawns = template.spawns or ((100, 300), (160, 300))
+        self.spawn_x = np.array([float(spawns[i][0]) if i < len(spawns) else 100.0 + i * 60
+                                 for i in range(num_players)])
+        self.spawn_y = np.array([float(spawns[i][1]) if i < len(spawns) else 300.0
+                                 for i in range(num_players)])
+
+        cols = template.colliders
+        self.col_x = np.array([c[0] for c in cols], dtype=float)
+        self.col_y = np.array([c[1] for c in cols], dtype=float)
+        self.col_w = np.array([c[2] for c in cols], dtype=float)
+        self.col_h = np.array([c[3] for c in cols], dtype=float)
+        self.col_mi = [c[4] for c in cols]
+        self.col_rule = [c[5] for c in cols]
+
+        plates = template.plates
+        self.plate_x = np.array([p[0] for p in plates], dtype=float)
+        self.plate_y = np.array([p[1] for p in plates], dtype=float)
+        self.plate_w = np.array([p[2] for p in plates], dtype=float)
+        self.plate_mi = [p[4] for p in plates]
+        self.plate_duo = [p[5] for p in plates]
+        # Assigned player column per plate, or -1 when that player is not in the session
+        self.plate_owner = [self.pids.index(p[6]) if p[6] in self.pids else -1 for p in plates]
+
+        self.load([])
+
+    # ── Moving state in and out of GameState objects ─────────────────────
+    def load(self, states):
+        n, p = len(states), self.num_players
+        players = [[state.players[pid] for pid in self.pids] for state in states]
+        self.x = np.array([[pl.x for pl in row] for row in players], dtype=float).reshape(n, p)
+        self.y = np.array([[pl.y for pl in row] for row in players], dtype=float).reshape(n, p)
+        self.vx = np.array([[pl.vx for pl in row] for row in players], dtype=float).reshape(n, p)
+        self.vy = np.array([[pl.vy for pl in row] for row in players], dtype=float).reshape(n, p)
+        self.on_ground = np.array([[pl.on_ground for pl in row] for row in players], dtype=bool).reshape(n, p)
+        self.tick = np.array([state.tick for state in states], dtype=np.int64)
+        self.moving_x = np.array([state.moving_x for state in states], dtype=float).reshape(
+            n, len(self.template.moving))
+        self.active = np.array([state.active for state in states], dtype=bool).reshape(
+            n, len(self.template.plates))
+        self.triggered = np.array([state.triggered for state in states], dtype=bool).reshape(
+            n, len(self.template.plates))
+        self.goal_locked = np.array([state.goal_locked for state in states], dtype=bool)
+
+    def store(self, states):
+        """Writes the arrays back into the GameState objects they were loaded from."""
+        x, y, vx, vy = self.x.tolist(), self.y.tolist(), self.vx.tolist(), self.vy.tolist()
+        on_ground, ticks = self.on_ground.tolist(), self.tick.tolist()
+        moving_x, active, triggered = self.moving_x.tolist(), self.active.tolist(), self.triggered.tolist()
+        goal_locked, doors_open = self.goal_locked.tolist(), self.doors_open().tolist()
+        for s, state in enumerate(states):
+            for j, pid in enumerate(self.pids):
+                pl = state.players[pid]
+                pl.x, pl.y, pl.vx, pl.vy = x[s][j], y[s][j], vx[s][j], vy[s][j]
+                pl.on_ground = on_ground[s][j]
+            state.tick = ticks[s]
+            state.moving_x = moving_x[s]
+            if (triggered[s] != state.triggered or goal_locked[s] != state.goal_locked):
+                state._invalidate_solids()
+            state.active = active[s]
+            state.triggered = triggered[s]
+            state.goal_locked = goal_locked[s]
+            state.doors_open = doors_open[s]
+            state._record_flag_changes()
+
+    # ── Simulation ───────────────────────────────────────────────────────
+    def apply_inputs(self, inputs):
+        """Vectorized GameState.apply_input for one {pid: keys} dict per session."""
+        for j, pid in enumerate(self.pids):
+            keys = [inp.get(pid) for inp in inputs]
+            has = np.array([k is not None for k in keys], dtype=bool)
+            left = np.array([bool(k and k.get('left')) for k in keys], dtype=bool)
+            right = np.array([bool(k and k.get('right')) for k in keys], dtype=bool)
+            jump = np.array([bool(k and k.get('jump')) for k in keys], dtype=bool) & self.on_ground[:, j]
+            vx = np.where(right, SPEED, np.where(left, -SPEED, 0))
+            self.vx[:, j] = np.where(has, vx, self.vx[:, j])
+            self.vy[:, j] = np.where(jump, JUMP_FORCE, self.vy[:, j])
+            self.on_ground[:, j] &= ~jump
+
+    def doors_open(self):
+        door = list(self.template.door_plates)
+        if not door:
+            return np.ones(len(self.tick), dtype=bool)
+        return self.triggered[:, door].all(axis=1)
+
+    def step(self):
+        """One GameState.update() for every loaded session."""
+        self.vy = np.minimum(self.vy + GRAVITY, TERMINAL_VY)
+        solid = self._solid_mask()
+        self.x = self.x + self.vx
+        self._resolve_x(solid)
+        self.y = self.y + self.vy
+        self._resolve_y(solid)
+
+        # Any player below death_y respawns the whole session
+        dead = (self.y > self.template.death_y).any(axis=1)
+        if dead.any():
+            self.x[dead] = self.spawn_x
+            self.y[dead] = self.spawn_y
+            self.vx[dead] = 0
+            self.vy[dead] = 0
+
+        self.tick += 1
+        self._animate()
+        self._update_plates()
+
+    def wins(self):
+        """Vectorized GameState.check_win()."""
+        gx, gy, gw, gh = self.template.goal
+        cx = self.x + PLAYER_W / 2
+        cy = self.y + PLAYER_H / 2
+        inside = (gx <= cx) & (cx <= gx + gw) & (gy <= cy) & (cy <= gy + gh)
+        return ~self.goal_locked & inside.all(axis=1)
+
+    def _animate(self):
+        # One shared trajectory row per distinct tick, the same rows GameState uses
+        if not self.template.moving:
+            return
+        ticks, where = np.unique(self.tick, return_inverse=True)
+        rows = np.array([self.template.trajectory.at(t) for t in ticks.tolist()], dtype=float)
+        self.moving_x[:] = rows[where]
+
+    def _solid_mask(self):
+        """(sessions, colliders) bool: which colliders are solid in each session."""
+        n = len(self.tick)
+        mask = np.empty((n, len(self.col_rule)), dtype=bool)
+        doors_closed = ~self.doors_open()
+        for c, rule in enumerate(self.col_rule):
+            if rule == ALWAYS:
+                mask[:, c] = True
+            elif rule == DOORS_CLOSED:
+                mask[:, c] = doors_closed
+            elif rule == GOAL_LOCKED:
+                mask[:, c] = self.goal_locked
+            else:
+                mask[:, c] = ~self.triggered[:, rule]
+        return mask
+
+    def _collider_x(self, c):
+        mi = self.col_mi[c]
+        if mi >= 0:
+            return self.moving_x[:, mi:mi + 1]  # (sessions, 1), broadcasts over players
+        return self.col_x[c]
+
+    def _resolve_x(self, solid):
+        x, y, vx = self.x, self.y, self.vx
+        for c in range(len(self.col_rule)):
+            tx, ty, tw, th = self._collider_x(c), self.col_y[c], self.col_w[c], self.col_h[c]
+            hit = (solid[:, c:c + 1] & (x < tx + tw) & (x + PLAYER_W > tx) &
+                   (y < ty + th) & (y + PLAYER_H > ty))
+            feet_overlap = (y + PLAYER_H) - ty
+            hit &= ~((feet_overlap > 0) & (feet_overlap <= STEP_HEIGHT))
+            x = np.where(hit & (vx > 0), tx - PLAYER_W, np.where(hit & (vx < 0), tx + tw, x))
+        self.x = x
+
+    def _resolve_y(self, solid):
+        x, y, vy = self.x, self.y, self.vy
+        on_ground = np.zeros_like(self.on_ground)
+        for c in range(len(self.col_rule)):
+            tx, ty, tw, th = self._collider_x(c), self.col_y[c], self.col_w[c], self.col_h[c]
+            hit = (solid[:, c:c + 1] & (x < tx + tw) & (x + PLAYER_W > tx) &
+                   (y < ty + th) & (y + PLAYER_H > ty))
+            land = hit & (vy >= 0)
+            y = np.where(land, ty - PLAYER_H, np.where(hit, ty + th, y))
+            vy = np.where(hit, 0.0, vy)
+            on_ground |= land
+        self.y, self.vy, self.on_ground = y, vy, on_ground
+
+    def _on_plate(self, i):
+        """(sessions, players) bool: GameState._player_on_plate for plate i."""
+        mi = self.plate_mi[i]
+        px = self.moving_x[:, mi:mi + 1] if mi >= 0 else self.plate_x[i]
+        cx = self.x + PLAYER_W / 2
+        in_x = (px <= cx) & (cx <= px + self.plate_w[i])
+        on_top = np.abs(self.y + PLAYER_H - self.plate_y[i]) < 10
+        return in_x & on_top
+
+    def _owner_on_plate(self, i):
+        owner = self.plate_owner[i]
+        if owner < 0:
+            return np.zeros(len(self.tick), dtype=bool)
+        return self._on_plate(i)[:, owner]
+
+    def _update_plates(self):
+        t = self.template
+        active, triggered = self.active, self.triggered
+
+        # Solo door plates and the solo goal plate: one-shot on first contact
+        solo = [i for i in t.door_plates if not self.plate_duo[i]]
+        if t.goal_plate is not None:
+            solo.append(t.goal_plate)
+        for i in solo:
+            open_ = ~triggered[:, i]
+            hit = self._on_plate(i).any(axis=1) & open_
+            active[:, i] = np.where(open_, hit, active[:, i])
+            triggered[:, i] |= hit
+            if i == t.goal_plate:
+                self.goal_locked &= ~hit
+
+        # Duo door plates and duo goal plates: all untriggered ones of a group
+        # must be active on the same tick
+        for group, unlocks_goal in (([i for i in t.door_plates if self.plate_duo[i]], False),
+                                    (list(t.goal_plates), True)):
+            if not group:
+                continue
+            open_ = ~triggered[:, group]
+            on = np.stack([self._owner_on_plate(i) for i in group], axis=1)
+            active[:, group] = np.where(open_, on, active[:, group])
+            fire = open_.any(axis=1) & (on | ~open_).all(axis=1)
+            triggered[:, group] |= open_ & fire[:, None]
+            if unlocks_goal:
+                self.goal_locked &= ~fire
+
+
+# ── Equivalence check against the scalar GameState ─────────────────────────
+
+def verify(sessions=40, ticks=1500, seed=0):
+    """Steps every level through both engines with random inputs; returns mismatches."""
+    mismatches = []
+    for num_players in (1, 2):
+        for level in (1, 2, 3):
+            rng = random.Random(seed * 100 + num_players * 10 + level)
+            scalar = [GameState(f'S{i}', num_players, level) for i in range(sessions)]
+            batch = [GameState(f'B{i}', num_players, level) for i in range(sessions)]
+            engine = BatchEngine(batch[0].template, num_players)
+            for t in range(ticks):
+                inputs = [{pid: {'left': rng.random() < 0.3, 'right': rng.random() < 0.5,
+                                 'jump': rng.random() < 0.2}
+                           for pid in engine.pids} for _ in range(sessions)]
+                for state, inp in zip(scalar, inputs):
+                    for pid, keys in inp.items():
+                        state.apply_input(pid, keys)
+                    state.update()
+                engine.load(batch)
+                engine.apply_inputs(inputs)
+                engine.step()
+                wins = engine.wins().tolist()
+                engine.store(batch)
+                for s, (a, b) in enumerate(zip(scalar, batch)):
+                    if a.serialize() != b.serialize() or a.check_win() != wins[s]:
+                        mismatches.append((num_players, level, s, t))
+                        break
+    return mismatches
+
+
+if __name__ == '__main__':
+    if not available():
+        sys.exit('numpy is not installed')
+    bad = verify()
+    for num_players, level, s, t in bad[:10]:
+        print(f'mismatch: players={num_players} level={level} session={s} tick={t}')
+    print('batch engine matches scalar path' if not bad else f'{len(bad)} mismatching runs')
+    sys.exit(1 if bad else 0)
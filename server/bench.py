@@ -0,0 +1,274 @@
+"""Headless simulation benchmarks.
+
+Creates N GameState sessions for every solo and duo level, drives them with
+scripted (seeded) or recorded input traces through apply_input/update, and
+reports ticks/sec, per-call time of update, serialize, serialize_delta and
+check_win, transient allocations per tick and peak RSS.
+
+    python bench.py                          # run and print a table
+    python bench.py --save-baseline base.json
+    python bench.py --compare base.json      # exit 1 if anything got slower
+    python bench.py --trace inputs.json      # replay a recorded trace
+    python bench.py --collision swept --dt 2 # swept collisions, 2 ticks per update
+
+A recorded trace is a JSON list with one {pid: {left, right, jump}} dict
+per tick; it is looped if shorter than --ticks.
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from game_state import COLLISIONS, GameState
+
+LEVELS = [(1, n) for n in (1, 2, 3)] + [(2, n) for n in (1, 2, 3)]
+
+# Metrics where a larger number is worse, compared in --compare mode
+TIME_METRICS = ('update_us', 'serialize_us', 'delta_us', 'check_win_us', 'alloc_kb_per_tick')
+# Smallest change of each metric worth reporting, in its own unit: below
+# this a difference is timer or allocator noise, at any tolerance
+NOISE_FLOOR = {'update_us': 1.0, 'serialize_us': 1.0, 'delta_us': 0.25, 'check_win_us': 0.1,
+               'alloc_kb_per_tick': 0.01}
+CHUNK = 10  # update() steps timed between two reference samples
+_REFERENCE = [None] * 50
+
+
+def scripted_trace(num_players, ticks, seed):
+    """Deterministic inputs: each player holds a random key combo for 1-40 ticks."""
+    rng = random.Random(seed)
+    held, left = {}, {}
+    trace = []
+    for _ in range(ticks):
+        frame = {}
+        for i in range(num_players):
+            pid = f'p{i+1}'
+            if left.get(pid, 0) <= 0:
+                held[pid] = {'left': rng.random() < 0.35, 'right': rng.random() < 0.5,
+                             'jump': rng.random() < 0.3}
+                left[pid] = rng.randint(1, 40)
+            left[pid] -= 1
+            frame[pid] = held[pid]
+        trace.append(frame)
+    return trace
+
+
+def load_trace(path):
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+    if not isinstance(trace, list) or not trace:
+        sys.exit(f'{path}: expected a non-empty JSON list of per-tick inputs')
+    return trace
+
+
+def bench_level(num_players, level, sessions, ticks, trace=None, seed=0, collision='discrete', dt=1):
+    states = [GameState(f'B{i}', num_players, level, collision) for i in range(sessions)]
+    traces = [trace or scripted_trace(num_players, ticks, seed + i) for i in range(sessions)]
+
+    # Pass 1: plain stepping for ticks/sec and update() time. With dt > 1
+    # every update() covers dt ticks and sees the input of the first.
+    # Timed passes run with the garbage collector off, as timeit does, so
+    # when a collection happens to land does not decide the result.
+    gc.collect()
+    gc.disable()
+    try:
+        steps_at = list(range(0, ticks, dt))
+        elapsed, update_rel = 0.0, []
+        for first in range(0, len(steps_at), CHUNK):
+            chunk = steps_at[first:first + CHUNK]
+            before = _reference_us()
+            start = time.perf_counter()
+            for t in chunk:
+                for state, tr in zip(states, traces):
+                    state.update(dt, tr[t % len(tr)])
+            took = time.perf_counter() - start
+            elapsed += took
+            update_rel.append(took / (len(chunk) * sessions) * 1e6 / ((before + _reference_us()) / 2))
+        steps = sessions * len(steps_at)
+
+        # Pass 2: the per-frame calls the server makes on top of update()
+        ser, ser_rel = _time_per_call(lambda s: s.serialize(), states)
+        delta, delta_rel = _time_per_call(lambda s: s.serialize_delta(s.tick - 1), states)
+        win, win_rel = _time_per_call(lambda s: s.check_win(), states)
+    finally:
+        gc.enable()
+
+    # Pass 3: transient allocations per tick (tracemalloc is slow, so keep it short)
+    alloc_ticks = min(ticks, 50)
+    tracemalloc.start()
+    peak_total = 0
+    for t in range(0, alloc_ticks, dt):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for state, tr in zip(states, traces):
+            state.update(dt, tr[t % len(tr)])
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {
+        'sessions': sessions,
+        'ticks': ticks,
+        'ticks_per_sec': round(sessions * ticks / elapsed),
+        'update_us': round(elapsed / steps * 1e6, 2),
+        'serialize_us': round(ser, 2),
+        'delta_us': round(delta, 2),
+        'check_win_us': round(win, 2),
+        'alloc_kb_per_tick': round(peak_total / alloc_ticks / sessions / 1024, 3),
+        'relative': {
+            'update_us': round(statistics.median(update_rel), 4),
+            'serialize_us': round(ser_rel, 4),
+            'delta_us': round(delta_rel, 4),
+            'check_win_us': round(win_rel, 4),
+        },
+    }
+
+
+def _reference(_):
+    # Fixed work of the same kind as serialize(): small dicts, lists and floats
+    frame = {}
+    for i in range(20):
+        frame[i] = {'x': i * 1.5, 'y': [i, i + 1], 'on': i & 1 == 0}
+    return frame
+
+
+def _reference_us():
+    """Time of _reference() right now.
+
+    Shared machines change speed from one second to the next. A sample
+    divided by the reference timed next to it stays comparable across runs,
+    which is what --compare checks.
+    """
+    return _sample(_reference, _REFERENCE, 0.002)
+
+
+def _sample(fn, states, min_time):
+    """Microseconds per call over at least `min_time` seconds of calls."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for state in states:
+            fn(state)
+        calls += len(states)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls * 1e6
+
+
+def _time_per_call(fn, states, samples=15, min_time=0.01):
+    """(fastest microseconds per call, median time relative to the reference work)."""
+    raw, rel = [], []
+    for _ in range(samples):
+        before = _reference_us()
+        took = _sample(fn, states, min_time)
+        raw.append(took)
+        rel.append(took / ((before + _reference_us()) / 2))
+    return min(raw), statistics.median(rel)
+
+
+def peak_rss_mb():
+    try:
+        import resource  # not available on Windows
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run(sessions, ticks, trace=None, seed=0, repeat=3, collision='discrete', dt=1):
+    """Best of `repeat` runs per level, so one noisy run does not fail --compare."""
+    results = {}
+    for num_players, level in LEVELS:
+        key = f"{'duo' if num_players == 2 else 'solo'}_{level}"
+        runs = [bench_level(num_players, level, sessions, ticks, trace, seed, collision, dt)
+                for _ in range(repeat)]
+        best = dict(runs[0])
+        for row in runs[1:]:
+            best['ticks_per_sec'] = max(best['ticks_per_sec'], row['ticks_per_sec'])
+            for metric in TIME_METRICS:
+                best[metric] = min(best[metric], row[metric])
+        # Ratios are not made smaller by noise the way times are, so take the typical one
+        best['relative'] = {metric: statistics.median(row['relative'][metric] for row in runs)
+                            for metric in runs[0]['relative']}
+        results[key] = best
+    return {'levels': results, 'peak_rss_mb': peak_rss_mb()}
+
+
+def print_table(report):
+    cols = ('ticks_per_sec', 'update_us', 'serialize_us', 'delta_us', 'check_win_us', 'alloc_kb_per_tick')
+    print(f"{'level':<8}" + ''.join(f'{c:>18}' for c in cols))
+    for key, row in report['levels'].items():
+        print(f'{key:<8}' + ''.join(f'{row[c]:>18}' for c in cols))
+    rss = report['peak_rss_mb']
+    print(f'peak RSS: {rss} MB' if rss is not None else 'peak RSS: -')
+
+
+def compare(report, baseline, tolerance, floor=NOISE_FLOOR):
+    """Lists every metric that got worse than the baseline by more than `tolerance`.
+
+    Times are compared relative to the reference work when both reports
+    have them, and reported scaled to the baseline's machine speed.
+    Differences under a metric's `floor` are treated as noise.
+    """
+    regressions = []
+    for key, row in report['levels'].items():
+        old = baseline['levels'].get(key)
+        if not old:
+            continue
+        relative = 'relative' in row and 'relative' in old
+        for metric in TIME_METRICS:
+            new = row[metric]
+            if relative and metric in old['relative'] and old['relative'][metric]:
+                new = round(old[metric] * row['relative'][metric] / old['relative'][metric], 2)
+            if old.get(metric) and new > max(old[metric] * (1 + tolerance), old[metric] + floor[metric]):
+                regressions.append(f'{key} {metric}: {old[metric]} -> {new}')
+        # ticks/sec is update_us inverted; only compared raw for older baselines
+        if not relative and old.get('ticks_per_sec') and row['ticks_per_sec'] < old['ticks_per_sec'] / (1 + tolerance):
+            regressions.append(f"{key} ticks_per_sec: {old['ticks_per_sec']} -> {row['ticks_per_sec']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless GameState benchmarks')
+    parser.add_argument('--sessions', type=int, default=100, help='sessions per level')
+    parser.add_argument('--ticks', type=int, default=300, help='ticks per session')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per level; the best is reported')
+    parser.add_argument('--trace', help='recorded input trace (JSON) instead of scripted inputs')
+    parser.add_argument('--collision', choices=COLLISIONS, default='discrete', help='GameState collision mode')
+    parser.add_argument('--dt', type=int, default=1, help='ticks per update() (default 1)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the report to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed slowdown before --compare fails (default 0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace) if args.trace else None
+    if args.dt < 1:
+        parser.error('--dt must be at least 1')
+    report = run(args.sessions, args.ticks, trace, args.seed, args.repeat, args.collision, args.dt)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(report)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            return 1
+        print('no regressions against', args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
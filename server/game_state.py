@@ -1,4 +1,9 @@
-import math
+import random
+import sys
+from collections import deque
+
+import levels
+from levels import UNLOCKS_GOAL
 
 GRAVITY = 0.6
 SPEED = 4
@@ -6,8 +11,11 @@ JUMP_FORCE = -13
 PLAYER_W = 32
 PLAYER_H = 48
 STEP_HEIGHT = 10  # px; lets player walk up onto thin plates/platforms
+COLLISIONS = ('discrete', 'swept')
 
 class Player:
+    __slots__ = ('id', 'x', 'y', 'vx', 'vy', 'on_ground', 'color')
+
     def __init__(self, pid, x, y, color):
         self.id = pid
         self.x = float(x)
@@ -18,29 +26,90 @@ class Player:
         self.color = color
 
 class GameState:
-    def __init__(self, session_id, num_players=1, level_num=1):
+    """One play session.
+
+    Level geometry lives in a LevelTemplate shared by every session on the
+    same level. A session only owns the state that changes during play:
+    players, tick, the x of each moving tile/plate, the active/triggered
+    flags of each plate and goal_locked.
+
+    Idle sessions are cheap: once a full update() leaves every player and
+    flag exactly as it was, with no moving tile able to reach a player,
+    further updates with the same inputs only advance the tick. moving_x is
+    brought up to date from the tick whenever it is read, as a row of the
+    level's shared trajectory table. Setting skip_quiet to False turns this
+    off; verify_quiet() checks that both give the same game.
+
+    collision='discrete' (the default) moves players one tick at a time and
+    then pushes them out of whatever they overlap, so anything thinner than
+    one tick of movement can be passed through. collision='swept' finds the
+    time of impact along each move instead, which lets update(dt) cover
+    several ticks in one step without tunnelling (see _move_swept).
+    """
+
+    def __init__(self, session_id, num_players=1, level_num=1, collision='discrete'):
+        if collision not in COLLISIONS:
+            raise ValueError(f'unknown collision mode {collision!r}')
         self.session_id = session_id
+        self.swept = collision == 'swept'
         self.num_players = num_players
         self.current_level = level_num
-        self.level = self.load_level(self.current_level)
+        self.template = self.load_level(self.current_level)
+        self.level = self.template.data  # read-only, shared
         self.tick = 0
         self.players = {}
         self._spawn_players()
+        # Compact mutable level state, indexed like template.moving / template.plates
+        self._moving_x = self.template.trajectory.at(0)  # a shared row, replaced, never mutated
+        self._moving_tick = 0  # tick _moving_x was looked up for
+        self.active = [False] * len(self.template.plates)
+        self.triggered = [False] * len(self.template.plates)
+        self.goal_locked = self.level.get('goal_locked', True)
+        self.doors_open = not self.template.door_plates
+        # Colliders: rebuilt only when a plate triggers or goal_locked flips
+        self._solids = None
+        self._grid = None
+        # Delta frames: tick at which each trigger flag last changed value
+        self._flags = self._flag_values()
+        self._flag_changed_at = [0] * len(self._flags)
+        # Player kinematics at a fixed point of update(), or None while anything moves
+        self._quiet = None
+        self.skip_quiet = True
+        # Plate triggers that have not fired yet (None: rebuild from triggered),
+        # and the player positions they were last evaluated at
+        self._armed = None
+        self._armed_moving = False
+        self._contacts = None
+        # Swept mode: pid -> (min, max) centre x a player covered in the last step
+        self._reach = {}
+
+    @property
+    def moving_x(self):
+        """x of each moving tile/plate at the current tick."""
+        if self._moving_tick != self.tick:
+            self._animate_moving()
+        return self._moving_x
+
+    @moving_x.setter
+    def moving_x(self, values):
+        self._moving_x = tuple(values)
+        self._moving_tick = self.tick
 
     def _spawn_players(self):
-        spawns = self.level.get('spawns', [{'x': 100, 'y': 300}, {'x': 160, 'y': 300}])
+        spawns = self.template.spawns or ((100, 300), (160, 300))
         colors = ['#e74c3c', '#3498db']
         for i in range(self.num_players):
             pid = f'p{i+1}'
-            sp = spawns[i] if i < len(spawns) else {'x': 100 + i * 60, 'y': 300}
-            self.players[pid] = Player(pid, sp['x'], sp['y'], colors[i])
+            sp = spawns[i] if i < len(spawns) else (100 + i * 60, 300)
+            self.players[pid] = Player(pid, sp[0], sp[1], colors[i])
 
     def respawn_all(self):
-        spawns = self.level.get('spawns', [{'x': 100, 'y': 300}, {'x': 160, 'y': 300}])
+        spawns = self.template.spawns or ((100, 300), (160, 300))
         for i, (pid, p) in enumerate(self.players.items()):
-            sp = spawns[i] if i < len(spawns) else {'x': 100 + i * 60, 'y': 300}
-            p.x, p.y = float(sp['x']), float(sp['y'])
+            sp = spawns[i] if i < len(spawns) else (100 + i * 60, 300)
+            p.x, p.y = float(sp[0]), float(sp[1])
             p.vx, p.vy = 0, 0
+        self._reach.clear()
 
     def apply_input(self, pid, inp):
         p = self.players.get(pid)
@@ -55,72 +124,129 @@ class GameState:
             p.vy = JUMP_FORCE
             p.on_ground = False
 
-    def update(self):
-        for p in self.players.values():
-            p.vy = min(p.vy + GRAVITY, 20)  # gravity + terminal velocity cap
-            # X axis: move then resolve horizontal collisions
-            p.x += p.vx
-            self._resolve_x(p)
-            # Y axis: move then resolve vertical collisions
-            p.y += p.vy
-            self._resolve_y(p)
+    def update(self, dt=1, inputs=None):
+        """Advances the session by `dt` whole ticks.
+
+        `inputs` (pid -> held keys) are applied before each of those ticks,
+        as if the session were stepped every tick. The discrete mode runs dt
+        single-tick steps; the swept mode moves every player tick by tick
+        and checks plates once for the whole step.
+        """
+        if dt != 1 and not self.swept:
+            for _ in range(dt):
+                self.update(1, inputs)
+            return
+        if inputs:
+            for pid, inp in inputs.items():
+                self.apply_input(pid, inp)
+        rest = None
+        if self.skip_quiet and not any(p.vx or p.vy for p in self.players.values()):
+            rest = self._rest_key()
+            if rest == self._quiet:
+                # The last full step changed nothing and nothing can reach the players
+                self.tick += dt
+                return
+        flags = self._flags
+        if self._moving_tick != self.tick:
+            self._animate_moving()  # catch up after quiet ticks
+
+        if self.swept:
+            self._move_swept(dt, inputs)
+        else:
+            for p in self.players.values():
+                p.vy = min(p.vy + GRAVITY, 20)  # gravity + terminal velocity cap
+                # X axis: move then resolve horizontal collisions
+                p.x += p.vx
+                self._resolve_x(p)
+                # Y axis: move then resolve vertical collisions
+                p.y += p.vy
+                self._resolve_y(p)
 
         # Check if any player fell into a pit / lava (below canvas)
-        death_y = self.level.get('death_y', 600)
+        death_y = self.template.death_y
         for p in self.players.values():
             if p.y > death_y:
                 self.respawn_all()
                 break
 
         # Animate oscillating tiles and plates
-        self.tick += 1
-        for tile in self.level['tiles']:
-            if tile.get('moving'):
-                tile['x'] = tile['move_center_x'] + tile['move_amp'] * math.sin(self.tick * tile['move_speed'])
-        for plate in self.level.get('pressure_plates', []):
-            if plate.get('moving'):
-                plate['x'] = plate['move_center_x'] + plate['move_amp'] * math.sin(self.tick * plate['move_speed'])
+        self.tick += dt
+        self._animate_moving()
 
         # Update pressure plates
         self._update_pressure_plates()
+        self._record_flag_changes()
+
+        if (rest is not None and not any(p.vx or p.vy for p in self.players.values()) and
+                self._rest_key() == rest and self._flags == flags and self._clear_of_movers()):
+            self._quiet = rest
+        else:
+            self._quiet = None
+
+    def _rest_key(self):
+        key = []
+        for p in self.players.values():
+            key += (p.x, p.y, p.vx, p.vy, p.on_ground)
+        return key
+
+    def _clear_of_movers(self):
+        """True if no moving tile or plate can touch or be stood on by any player."""
+        margin = STEP_HEIGHT  # plates count a player this far above them as standing
+        for x0, y0, x1, y1 in self.template.moving_sweep:
+            for p in self.players.values():
+                if (p.x - margin < x1 and p.x + PLAYER_W + margin > x0 and
+                        p.y - margin < y1 and p.y + PLAYER_H + margin > y0):
+                    return False
+        return True
+
+    def _animate_moving(self):
+        tick = self._moving_tick = self.tick
+        self._moving_x = self.template.trajectory.at(tick)
 
     def _get_solid_tiles(self):
-        """Returns all currently solid tiles for collision."""
-        tiles = self.level['tiles'][:]
-
-        # Main doors: solid until all door plates triggered
-        if not self._all_plates_active():
-            for door in self.level.get('doors', []):
-                tiles.append(door)
-
-        # Door pressure plates: solid until triggered
-        for plate in self.level.get('pressure_plates', []):
-            if not plate.get('triggered', False):
-                tiles.append(plate)
-
-        # Goal plate: solid until triggered (solo mode)
-        goal_plate = self.level.get('goal_plate')
-        if goal_plate and not goal_plate.get('triggered', False):
-            tiles.append(goal_plate)
-
-        # Duo goal plates: each solid until triggered
-        for gp in self.level.get('goal_plates', []):
-            if not gp.get('triggered', False):
-                tiles.append(gp)
-
-        # Goal door: solid until goal plate(s) triggered
-        if self.level.get('goal_locked', True):
-            goal_door = self.level.get('goal_door')
-            if goal_door:
-                tiles.append(goal_door)
-
-        return tiles
-
-    def _resolve_x(self, p):
-        """Resolve horizontal collisions only. Allows stepping up thin ledges."""
-        for tile in self._get_solid_tiles():
-            tx, ty = tile['x'], tile['y']
-            tw, th = tile['w'], tile['h']
+        """Returns the indices of all currently solid colliders in template.colliders.
+
+        Cached until _invalidate_solids() is called, which must happen
+        whenever a trigger flag changes. The matching broad-phase grid is
+        shared with every other session in the same trigger state.
+        """
+        if self._solids is None:
+            self._solids = self.template.solid_ids(not self.doors_open, self.goal_locked, self.triggered)
+            self._grid = self.template.grid(self._solids)
+        return self._solids
+
+    def _invalidate_solids(self):
+        self._solids = None
+        self._quiet = None
+        self._armed = None
+
+    def _player_span(self, p):
+        return self._grid.span(p.x, p.y, p.x + PLAYER_W, p.y + PLAYER_H)
+
+    def _resolve_x(self, p, mx=None, after=-1):
+        """Resolve horizontal collisions only. Allows stepping up thin ledges.
+
+        Only colliders in the grid cells around the player are checked, in
+        collider order, as if scanning the whole list. If a push moves the
+        player into other cells, the rest of the candidates are re-queried.
+        The swept mode passes the moving x positions at its time of impact
+        and the collider it stopped at, to resolve only the ones after it.
+        """
+        self._get_solid_tiles()
+        colliders = self.template.colliders
+        if mx is None:
+            mx = self._moving_x  # synced at the start of update()
+        span = self._player_span(p)
+        cands = self._grid.query(span)
+        if after >= 0:
+            cands = [j for j in cands if j > after]
+        k = 0
+        while k < len(cands):
+            i = cands[k]
+            k += 1
+            tx, ty, tw, th, mi, _ = colliders[i]
+            if mi >= 0:
+                tx = mx[mi]
             if (p.x < tx + tw and p.x + PLAYER_W > tx and
                     p.y < ty + th and p.y + PLAYER_H > ty):
                 # If feet barely clip the tile's top surface, let Y resolve it (step-up)
@@ -131,13 +257,35 @@ class GameState:
                     p.x = tx - PLAYER_W
                 elif p.vx < 0:
                     p.x = tx + tw
-
-    def _resolve_y(self, p):
-        """Resolve vertical collisions only. Prevents jumping through tile bottoms."""
-        p.on_ground = False
-        for tile in self._get_solid_tiles():
-            tx, ty = tile['x'], tile['y']
-            tw, th = tile['w'], tile['h']
+                else:
+                    continue
+                moved = self._player_span(p)
+                if moved != span:
+                    span = moved
+                    cands, k = [j for j in self._grid.query(span) if j > i], 0
+
+    def _resolve_y(self, p, mx=None, after=-1):
+        """Resolve vertical collisions only. Prevents jumping through tile bottoms.
+
+        `mx` and `after` as in _resolve_x.
+        """
+        self._get_solid_tiles()
+        colliders = self.template.colliders
+        if mx is None:
+            mx = self._moving_x  # synced at the start of update()
+        span = self._player_span(p)
+        cands = self._grid.query(span)
+        if after >= 0:
+            cands = [j for j in cands if j > after]
+        else:
+            p.on_ground = False
+        k = 0
+        while k < len(cands):
+            i = cands[k]
+            k += 1
+            tx, ty, tw, th, mi, _ = colliders[i]
+            if mi >= 0:
+                tx = mx[mi]
             if (p.x < tx + tw and p.x + PLAYER_W > tx and
                     p.y < ty + th and p.y + PLAYER_H > ty):
                 if p.vy >= 0:    # falling / standing: land on top surface
@@ -147,340 +295,322 @@ class GameState:
                 else:            # moving upward: blocked by underside
                     p.y = ty + th
                     p.vy = 0
-
-    def _check_plate(self, plate):
-        """Returns True if any player is standing on the given plate."""
+                moved = self._player_span(p)
+                if moved != span:
+                    span = moved
+                    cands, k = [j for j in self._grid.query(span) if j > i], 0
+
+    # ── Swept collision ──────────────────────────────────────────────────
+    def _move_swept(self, dt, inputs):
+        """Moves every player through `dt` ticks without passing through anything.
+
+        Each tick is a move of its own, x then y as in the discrete mode,
+        with the held inputs applied again before it, so a jump held through
+        a landing fires again. A move stops at the first collider it would
+        enter rather than being pushed out afterwards. A moving collider is
+        taken to travel in a straight line during the tick.
+        """
+        self._get_solid_tiles()
+        trajectory, tick, reach = self.template.trajectory, self.tick, self._reach
+        start = self._moving_x  # synced at the start of update()
+        for k in range(dt):
+            if k and inputs:
+                for pid, inp in inputs.items():
+                    self.apply_input(pid, inp)
+            end = trajectory.at(tick + k + 1)
+            for p in self.players.values():
+                p.vy = min(p.vy + GRAVITY, 20)
+                self._sweep_x(p, p.vx, start, end)
+                # Where the discrete mode would have checked plates: after each of the dt ticks
+                center = p.x + PLAYER_W / 2
+                lo, hi = reach[p.id] if k else (center, center)
+                reach[p.id] = (min(lo, center), max(hi, center))
+                self._sweep_y(p, p.vy, start, end)
+            start = end
+
+    def _sweep_x(self, p, dx, start, end):
+        """Horizontal move by dx, stopped by the earliest collider in the way.
+
+        Step-up overlaps are skipped, as in _resolve_x, and a collider the
+        player already overlaps and does not move clear of counts as hit at
+        once. Colliders after the one hit then push the player as
+        _resolve_x would.
+        """
+        if not dx:
+            return  # the discrete mode never pushes a player that is not walking
+        colliders = self.template.colliders
+        x0, y = p.x, p.y
+        cands = self._grid.query(self._grid.span(min(x0, x0 + dx), y, max(x0, x0 + dx) + PLAYER_W, y + PLAYER_H))
+        first, hit = 2.0, -1  # time of impact (0..1) and the collider hit
+        for i in cands:
+            tx, ty, tw, th, mi, _ = colliders[i]
+            if not (y < ty + th and y + PLAYER_H > ty):
+                continue
+            if 0 < (y + PLAYER_H) - ty <= STEP_HEIGHT:
+                continue
+            rel = dx  # player motion relative to the collider
+            if mi >= 0:
+                tx = start[mi]
+                rel -= end[mi] - tx
+            if x0 < tx + tw and x0 + PLAYER_W > tx:
+                if not (x0 + dx < tx + tw and x0 + dx + PLAYER_W > tx):
+                    continue  # moves clear of it, which the discrete mode never sees
+                t = 0.0
+            elif dx > 0 and x0 + PLAYER_W <= tx < x0 + rel + PLAYER_W:
+                t = (tx - x0 - PLAYER_W) / rel
+            elif dx < 0 and x0 + rel < tx + tw <= x0:
+                t = (tx + tw - x0) / rel
+            else:
+                continue  # out of reach, or only touching at the end like the discrete mode
+            if t < first:  # ties go to the earlier collider, like the discrete scan
+                first, hit = t, i
+        if hit < 0:
+            p.x = x0 + dx
+            return
+        mx = self._moving_at(start, end, first)
+        tx, _, tw, _, mi, _ = colliders[hit]
+        if mi >= 0:
+            tx = mx[mi]
+        p.x = tx - PLAYER_W if dx > 0 else tx + tw
+        self._resolve_x(p, mx, hit)
+
+    def _sweep_y(self, p, dy, start, end):
+        """Vertical move by dy, landing on or bumping the earliest collider in the way.
+
+        A collider the player already overlaps (e.g. one it just stepped up
+        onto) and does not move clear of counts as hit at once and is
+        resolved as in _resolve_y.
+        """
+        p.on_ground = False
+        colliders = self.template.colliders
+        x, y0 = p.x, p.y
+        cands = self._grid.query(self._grid.span(x, min(y0, y0 + dy), x + PLAYER_W, max(y0, y0 + dy) + PLAYER_H))
+        first, hit = 2.0, -1  # time of impact (0..1) and the collider hit
+        for i in cands:
+            tx, ty, tw, th, mi, _ = colliders[i]
+            if y0 < ty + th and y0 + PLAYER_H > ty:
+                if not (y0 + dy < ty + th and y0 + dy + PLAYER_H > ty):
+                    continue  # moves clear of it, which the discrete mode never sees
+                t = 0.0
+            elif dy > 0 and y0 + PLAYER_H <= ty < y0 + dy + PLAYER_H:
+                t = (ty - y0 - PLAYER_H) / dy
+            elif dy < 0 and y0 + dy < ty + th <= y0:
+                t = (ty + th - y0) / dy
+            else:
+                continue  # out of reach, or only touching at the end like the discrete mode
+            if t >= first:
+                continue
+            if mi >= 0:
+                tx = start[mi] + (end[mi] - start[mi]) * t
+            if x < tx + tw and x + PLAYER_W > tx:
+                first, hit = t, i
+        if hit < 0:
+            p.y = y0 + dy
+            return
+        _, ty, _, th, _, _ = colliders[hit]
+        if p.vy >= 0 if first == 0 else dy > 0:  # falling / standing: land on top surface
+            p.y = ty - PLAYER_H
+            p.on_ground = True
+        else:                                    # moving upward: blocked by underside
+            p.y = ty + th
+        p.vy = 0
+        self._resolve_y(p, self._moving_at(start, end, first), hit)
+
+    @staticmethod
+    def _moving_at(start, end, t):
+        """Moving x positions a fraction t of the way through the current step."""
+        if t == 0 or start is end:
+            return start
+        return tuple(a + (b - a) * t for a, b in zip(start, end))
+
+    def _check_plate(self, i):
+        """Returns True if any player is standing on plate i."""
         for p in self.players.values():
-            if self._player_on_plate(p, plate):
+            if self._player_on_plate(p, i):
                 return True
         return False
 
-    def _player_on_plate(self, player, plate):
-        """Returns True if a specific player object is standing on the plate."""
+    def _player_on_plate(self, player, i):
+        """Returns True if a specific player object is standing on plate i."""
+        x, y, w, _, mi, _, _ = self.template.plates[i]
+        if mi >= 0:
+            x = self.moving_x[mi]
         px_center = player.x + PLAYER_W / 2
         py_bottom = player.y + PLAYER_H
-        in_x  = plate['x'] <= px_center <= plate['x'] + plate['w']
-        on_top = abs(py_bottom - plate['y']) < 10
+        if self.swept:
+            # Walking across a plate inside one step still counts
+            lo, hi = self._reach.get(player.id, (px_center, px_center))
+            in_x = lo <= x + w and x <= hi
+        else:
+            in_x  = x <= px_center <= x + w
+        on_top = abs(py_bottom - y) < 10
         return in_x and on_top
 
     def _update_pressure_plates(self):
-        plates = self.level.get('pressure_plates', [])
-        duo_plates  = [pl for pl in plates if pl.get('duo')  and not pl.get('triggered')]
-        solo_plates = [pl for pl in plates if not pl.get('duo') and not pl.get('triggered')]
-
-        # Solo door plates: one-shot on first contact by any player
-        for plate in solo_plates:
-            plate['active'] = False
-            if self._check_plate(plate):
-                plate['triggered'] = True
-                plate['active'] = True
-
-        # Duo door plates: each plate has a 'player' field (e.g. 'p1' or 'p2').
-        # It only becomes active when THAT specific player is standing on it.
-        for plate in duo_plates:
-            assigned_pid = plate.get('player')   # e.g. 'p1' or 'p2'
-            player_obj   = self.players.get(assigned_pid)
-            if player_obj and self._player_on_plate(player_obj, plate):
-                plate['active'] = True
+        """Evaluates the plate triggers that have not fired yet.
+
+        Fired triggers leave the work set for good, and the rest are only
+        looked at again once a player (or one of their moving plates) has
+        moved, since nothing else can change whether a plate is stood on.
+        """
+        armed = self._armed
+        if armed is None:
+            armed = self._arm()
+        if not armed:
+            return
+        contacts = [self._moving_x] if self._armed_moving else []
+        for p in self.players.values():
+            contacts += (p.x, p.y)
+        if contacts == self._contacts:
+            return
+        self._contacts = contacts
+
+        plates, players = self.template.plates, self.players
+        active, triggered = self.active, self.triggered
+        doors = False
+        for ids, needs_all, unlocks_goal, _ in armed:
+            if needs_all:
+                # Each plate counts only while its assigned player stands on it
+                fired = True
+                for i in ids:
+                    player_obj = players.get(plates[i][6])
+                    active[i] = on = bool(player_obj and self._player_on_plate(player_obj, i))
+                    fired = fired and on
             else:
-                plate['active'] = False
-
-        # Open the door permanently only when ALL duo plates are active simultaneously
-        if duo_plates and all(pl['active'] for pl in duo_plates):
-            for plate in duo_plates:
-                plate['triggered'] = True
-
-        # Solo goal plate — any player triggers alone
-        goal_plate = self.level.get('goal_plate')
-        if goal_plate and not goal_plate.get('triggered', False):
-            goal_plate['active'] = False
-            if self._check_plate(goal_plate):
-                goal_plate['triggered'] = True
-                goal_plate['active'] = True
-                self.level['goal_locked'] = False
-
-        # Duo goal plates — each assigned to a specific player;
-        # BOTH must stand on their plate simultaneously to unlock the goal
-        goal_plates = self.level.get('goal_plates', [])
-        untriggered_gps = [gp for gp in goal_plates if not gp.get('triggered')]
-        for gp in untriggered_gps:
-            player_obj = self.players.get(gp.get('player'))
-            gp['active'] = bool(player_obj and self._player_on_plate(player_obj, gp))
-        if untriggered_gps and all(gp['active'] for gp in untriggered_gps):
-            for gp in untriggered_gps:
-                gp['triggered'] = True
-            self.level['goal_locked'] = False
-
-    def _all_plates_active(self):
-        plates = self.level.get('pressure_plates', [])
-        if not plates:
-            return True
-        return all(plate.get('triggered', False) for plate in plates)
+                active[ids[0]] = fired = self._check_plate(ids[0])
+            if unlocks_goal:
+                if fired:
+                    self.goal_locked = False
+            else:
+                doors = True
+            if fired:
+                for i in ids:
+                    triggered[i] = True
+                self._invalidate_solids()  # also rebuilds the work set next tick
+        if doors:
+            self.doors_open = all(triggered[i] for i in self.template.door_plates)
+
+    def _arm(self):
+        """Rebuilds the work set from the triggered flags, after any of them changed."""
+        triggered = self.triggered
+        armed = self._armed = [(tuple(i for i in ids if not triggered[i]), needs_all, effect == UNLOCKS_GOAL, moves)
+                               for ids, needs_all, effect, moves in self.template.triggers
+                               if not all(triggered[i] for i in ids)]
+        self._armed_moving = any(t[3] for t in armed)
+        self._contacts = None
+        return armed
+
+    # ── Snapshots ────────────────────────────────────────────────────────
+    def snapshot(self):
+        """Everything update() can change, as one flat tuple of immutable values.
+
+        Level geometry is shared and never copied, so this costs the same
+        whatever the level size.
+        """
+        kinematics = []
+        for p in self.players.values():
+            kinematics += (p.x, p.y, p.vx, p.vy, p.on_ground)
+        return (self.tick, tuple(kinematics), tuple(self.moving_x), tuple(self.active),
+                tuple(self.triggered), self.goal_locked, self.doors_open,
+                tuple(self._flag_changed_at))
+
+    def restore(self, snap):
+        """Puts the session back to a snapshot() taken from this session or its level."""
+        (self.tick, kinematics, moving_x, active, triggered,
+         self.goal_locked, self.doors_open, changed_at) = snap
+        for i, p in enumerate(self.players.values()):
+            p.x, p.y, p.vx, p.vy, p.on_ground = kinematics[5 * i:5 * i + 5]
+        self._moving_x = tuple(moving_x)
+        self._moving_tick = self.tick
+        self.active[:] = active
+        self.triggered[:] = triggered
+        self._flag_changed_at[:] = changed_at
+        self._flags = self._flag_values()
+        self._invalidate_solids()
 
     def check_win(self):
-        if self.level.get('goal_locked', True):
+        if self.goal_locked:
             return False
-        goal = self.level['goal']
+        gx, gy, gw, gh = self.template.goal
         return all(
-            goal['x'] <= p.x + PLAYER_W / 2 <= goal['x'] + goal['w'] and
-            goal['y'] <= p.y + PLAYER_H / 2 <= goal['y'] + goal['h']
+            gx <= p.x + PLAYER_W / 2 <= gx + gw and
+            gy <= p.y + PLAYER_H / 2 <= gy + gh
             for p in self.players.values()
         )
 
     def load_level(self, n):
-        if self.num_players >= 2:
-            return self._load_duo_level(n)
-        return self._load_solo_level(n)
-
-    def _load_solo_level(self, n):
-        levels = {
-            1: {
-                'spawns': [{'x': 60, 'y': 320}, {'x': 120, 'y': 320}],
-                'tiles': [
-                    {'x': 0,   'y': 400, 'w': 250, 'h': 20},
-                    {'x': 330, 'y': 400, 'w': 470, 'h': 20},
-                    {'x': 400, 'y': 310, 'w': 100, 'h': 16},
-                    {'x': 560, 'y': 255, 'w': 100, 'h': 16},
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420},
-                ],
-                'doors': [{'x': 310, 'y': 0, 'w': 20, 'h': 420}],
-                'pressure_plates': [
-                    {'x': 180, 'y': 392, 'w': 60, 'h': 8, 'active': False, 'triggered': False}
-                ],
-                'goal_plate': {'x': 580, 'y': 247, 'w': 60, 'h': 8, 'active': False, 'triggered': False},
-                'goal_door': {'x': 680, 'y': 0, 'w': 20, 'h': 420},
-                'goal_locked': True,
-                'goal': {'x': 712, 'y': 355, 'w': 55, 'h': 45},
-            },
-            2: {
-                # Level 2: plates are elevated on platforms — requires platforming to reach
-                'spawns': [{'x': 60, 'y': 320}, {'x': 110, 'y': 320}],
-                'tiles': [
-                    # Left ground
-                    {'x': 0,   'y': 400, 'w': 250, 'h': 20},
-                    # Left stepping platforms (staircase upward)
-                    {'x': 80,  'y': 320, 'w': 80,  'h': 16},
-                    {'x': 190, 'y': 240, 'w': 80,  'h': 16},
-                    # Right ground (after door)
-                    {'x': 330, 'y': 400, 'w': 50, 'h': 20},
-                    # Right platforms
-                    {'x': 380, 'y': 320, 'w': 80,  'h': 16},
-                    {'x': 510, 'y': 200, 'w': 80,  'h': 16},
-                    {'x': 620, 'y': 320, 'w': 80,  'h': 16},
-                    {'x': 715, 'y': 110, 'w': 100,  'h': 16},
-                    # Walls
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420},
-                ],
-                # Main barrier
-                'doors': [{'x': 310, 'y': 0, 'w': 20, 'h': 420}],
-                # Door plate on the upper-left platform — must jump up staircase to reach
-                'pressure_plates': [
-                    {'x': 200, 'y': 232, 'w': 60, 'h': 8, 'active': False, 'triggered': False}
-                ],
-                # Goal plate on lower right platform — must drop down to reach
-                'goal_plate': {'x': 626, 'y': 312, 'w': 60, 'h': 8, 'active': False, 'triggered': False},
-                'goal_door': {'x': 690, 'y': 0, 'w': 20, 'h': 420},
-                'goal_locked': True,
-                'goal': {'x': 715, 'y': 55, 'w': 55, 'h': 45},
-            },
-            3: {
-                # Level 3 — Lava World: no ground, only floating rock platforms.
-                # Falling past death_y (into lava) respawns all players.
-                'theme': 'lava',
-                'death_y': 420,
-                'spawns': [{'x': 30, 'y': 310}, {'x': 75, 'y': 310}],
-                'tiles': [
-                    # Spawn platform (anchored to left wall)
-                    {'x': 16,  'y': 365, 'w': 110, 'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a'},
-                    # Platform 2
-                    {'x': 175, 'y': 320, 'w': 80,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e'},
-                    # Platform 3 — door plate sits here (oscillates left-right)
-                    {'x': 280, 'y': 200, 'w': 80,  'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a',
-                     'moving': True, 'move_center_x': 280, 'move_amp': 55, 'move_speed': 0.025},
-                    # Platform 4 (right of door)
-                    # {'x': 440, 'y': 352, 'w': 80,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e'},
-                    # Platform 5 — elevated, goal plate sits here
-                    {'x': 535, 'y': 150, 'w': 85,  'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a'},
-                    # Platform 6 — landing before goal door
-                    {'x': 640, 'y': 350, 'w': 75,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e'},
-                    # Goal platform (against right wall)
-                    {'x': 16, 'y': 125, 'w': 48,  'h': 16, 'color': '#4a4a4a', 'shadow': '#222222'},
-                    # Walls (dark rock)
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420, 'color': '#4a4a4a', 'shadow': '#222222'},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420, 'color': '#4a4a4a', 'shadow': '#222222'},
-                ],
-                'doors': [{'x': 400, 'y': 0, 'w': 20, 'h': 420}],
-                'pressure_plates': [
-                    # Plate x offset matches platform (tile center 280, plate center 290 = +10px)
-                    {'x': 290, 'y': 192, 'w': 60, 'h': 8, 'active': False, 'triggered': False,
-                     'moving': True, 'move_center_x': 290, 'move_amp': 55, 'move_speed': 0.025}
-                ],
-                'goal_plate': {'x': 547, 'y': 142, 'w': 60, 'h': 8, 'active': False, 'triggered': False},
-                # 'goal_door':  {'x': 716, 'y': 0,   'w': 20, 'h': 420},
-                'goal_locked': True,
-                'goal': {'x': 16, 'y': 75, 'w': 48, 'h': 45},
-            }
-        }
-        return levels.get(n, levels[1])
-
-    def _load_duo_level(self, n):
-        # All duo plates assigned per-player; doors/goal only open when BOTH
-        # assigned players stand on their plates simultaneously.
-        levels = {
-            1: {
-                # Both players spawn together center-left
-                'spawns': [{'x': 100, 'y': 350}, {'x': 145, 'y': 350}],
-                'tiles': [
-                    # Left ground
-                    {'x': 0,   'y': 400, 'w': 300, 'h': 20},
-                    # P1 door platform (left) — P1 jumps up here
-                    {'x': 28,  'y': 295, 'w': 100, 'h': 16},
-                    # P2 door platform (right of left zone) — P2 jumps up here
-                    {'x': 183, 'y': 295, 'w': 100, 'h': 16},
-                    # Right ground
-                    {'x': 335, 'y': 400, 'w': 450, 'h': 20},
-                    # P1 goal platform (mid-left)
-                    {'x': 375, 'y': 310, 'w': 100, 'h': 16},
-                    # P2 goal platform (mid-upper)
-                    {'x': 530, 'y': 245, 'w': 100, 'h': 16},
-                    # Landing platform near goal room
-                    {'x': 655, 'y': 310, 'w': 90,  'h': 16},
-                    # Walls
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420},
-                ],
-                'doors': [{'x': 315, 'y': 0, 'w': 20, 'h': 420}],
-                # P1 door plate on left platform; P2 door plate on right platform
-                'pressure_plates': [
-                    {'x': 38,  'y': 287, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1'},
-                    {'x': 193, 'y': 287, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2'},
-                ],
-                # P1 star plate on mid-left platform; P2 star plate on mid-upper platform
-                'goal_plates': [
-                    {'x': 385, 'y': 302, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1'},
-                    {'x': 540, 'y': 237, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2'},
-                ],
-                'goal_door':  {'x': 700, 'y': 0, 'w': 20, 'h': 420},
-                'goal_locked': True,
-                'goal': {'x': 722, 'y': 355, 'w': 55, 'h': 45},
-            },
-            2: {
-                # Level 2 — split staircase: each player climbs their own tower
-                'spawns': [{'x': 100, 'y': 350}, {'x': 145, 'y': 350}],
-                'tiles': [
-                    # Left ground
-                    {'x': 0,   'y': 400, 'w': 280, 'h': 20},
-                    # Shared first step (both can use)
-                    {'x': 65,  'y': 330, 'w': 170, 'h': 16},
-                    # P1 tower (left branch, two steps)
-                    # {'x': 16,  'y': 255, 'w': 90,  'h': 16},
-                    {'x': 16,  'y': 175, 'w': 90,  'h': 16},
-                    # P2 tower (right branch, two steps)
-                    {'x': 200, 'y': 255, 'w': 90,  'h': 16},
-                    {'x': 210, 'y': 175, 'w': 90,  'h': 16},
-                    # Right ground
-                    {'x': 335, 'y': 400, 'w': 455, 'h': 20},
-                    # Right landing step
-                    {'x': 365, 'y': 330, 'w': 90,  'h': 16},
-                    # P1 goal tower (right zone)
-                    {'x': 460, 'y': 275, 'w': 90,  'h': 16},
-                    {'x': 460, 'y': 175, 'w': 90,  'h': 16},
-                    # P2 goal tower (further right)
-                    # {'x': 570, 'y': 255, 'w': 90,  'h': 16},
-                    {'x': 570, 'y': 230, 'w': 90,  'h': 16},
-                    # Walls
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420},
-                ],
-                'doors': [{'x': 315, 'y': 0, 'w': 20, 'h': 420}],
-                # P1 door plate on top of P1 left tower; P2 door plate on top of P2 left tower
-                'pressure_plates': [
-                    {'x': 25,  'y': 167, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1'},
-                    {'x': 220, 'y': 167, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2'},
-                ],
-                # P1 star plate on top of P1 right tower; P2 star plate on top of P2 right tower
-                'goal_plates': [
-                    {'x': 469, 'y': 167, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1'},
-                    {'x': 579, 'y': 222, 'w': 70, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2'},
-                ],
-                'goal_door':  {'x': 700, 'y': 0, 'w': 20, 'h': 420},
-                'goal_locked': True,
-                'goal': {'x': 722, 'y': 355, 'w': 55, 'h': 45},
+        """The shared, compiled template for level n."""
+        return levels.get_level(self.num_players, n)
+
+    def _flag_values(self):
+        """Every trigger flag a frame can carry, in _flag_path() order."""
+        values = []
+        for a, t in zip(self.active, self.triggered):
+            values += (a, t)
+        values += (self.goal_locked, self.doors_open)
+        return values
+
+    def _flag_path(self, i):
+        """Maps a _flag_values() index to (group, index or None, field)."""
+        template = self.template
+        plate, field = divmod(i, 2)
+        if plate >= len(template.plates):
+            return None, None, ('goal_locked', 'doors_open')[field]
+        field = ('active', 'triggered')[field]
+        if plate == template.goal_plate:
+            return 'goal_plate', None, field
+        if plate in template.goal_plates:
+            return 'goal_plates', template.goal_plates.index(plate), field
+        return 'pressure_plates', template.door_plates.index(plate), field
+
+    def _record_flag_changes(self):
+        flags = self._flag_values()
+        for i, value in enumerate(flags):
+            if value != self._flags[i]:
+                self._flag_changed_at[i] = self.tick
+        self._flags = flags
+
+    def serialize_delta(self, since):
+        """Returns only what changed after tick `since`, on top of a full frame.
+
+        Player kinematics and moving x positions are always sent (they are
+        absolute), flags only if they changed at any point after `since`.
+        The result is therefore valid for any client whose frame tick lies
+        between `since` and `tick`; a client that is further behind (frame
+        tick < `base`) has missed something and must ask for a resync.
+        """
+        flags = {}
+        for i, changed_at in enumerate(self._flag_changed_at):
+            if changed_at > since:
+                group, idx, field = self._flag_path(i)
+                if group is None:
+                    flags[field] = self._flags[i]
+                elif idx is None:
+                    flags.setdefault(group, {})[field] = self._flags[i]
+                else:
+                    flags.setdefault(group, {}).setdefault(idx, {})[field] = self._flags[i]
+        moving = {'tiles': {}, 'pressure_plates': {}}
+        for (group, idx), x in zip(self.template.moving_refs, self.moving_x):
+            moving[group][idx] = x
+        return {
+            'tick': self.tick,
+            'base': since,
+            'players': {
+                pid: {
+                    'x': p.x, 'y': p.y,
+                    'vx': p.vx, 'vy': p.vy,
+                    'on_ground': p.on_ground
+                }
+                for pid, p in self.players.items()
             },
-            3: {
-                # Duo Level 3 — Lava World.
-                # P1 spawns far-left, P2 far-right. Each has a door plate on
-                # their own elevated platform. Two doors split the level;
-                # both must stand simultaneously to open them.
-                # After the doors open, both players converge to the middle
-                # and must stand on their assigned ★ plates simultaneously
-                # to reveal the goal on the upper central platform.
-                'theme': 'lava',
-                'death_y': 420,
-                'spawns': [{'x': 50, 'y': 317}, {'x': 720, 'y': 317}],
-                'tiles': [
-                    # Walls (dark rock)
-                    {'x': 0,   'y': 0,   'w': 16,  'h': 420, 'color': '#4a4a4a', 'shadow': '#222222'},
-                    {'x': 784, 'y': 0,   'w': 16,  'h': 420, 'color': '#4a4a4a', 'shadow': '#222222'},
-                    # ── P1 zone (left) ────────────────────
-                    # P1 spawn platform — anchored to left wall
-                    {'x': 16,  'y': 365, 'w': 110, 'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a'},
-                    # P1 hop platform (moving — must time the jump!)
-                    # {'x': 165, 'y': 310, 'w': 80,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e',
-                    #  'moving': True, 'move_center_x': 165, 'move_amp': 25, 'move_speed': 0.020},
-                    # P1 door plate platform (elevated, moving — must time the jump!)
-                    {'x': 150, 'y': 245, 'w': 80,  'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a',
-                     'moving': True, 'move_center_x': 150, 'move_amp': 35, 'move_speed': 0.022},
-                    # ── Middle zone ────────────────────
-                    # P1 ★ goal platform (left of center, static)
-                    {'x': 315, 'y': 300, 'w': 75,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e'},
-                    # Upper central platform — goal appears here (static)
-                    {'x': 350, 'y': 215, 'w': 100, 'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a'},
-                    # P2 ★ goal platform (right of center, static)
-                    {'x': 410, 'y': 300, 'w': 75,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e'},
-                    # ── P2 zone (right) ────────────────────
-                    # P2 door plate platform (elevated, moving — mirrors P1 door platform)
-                    {'x': 545, 'y': 245, 'w': 80,  'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a',
-                     'moving': True, 'move_center_x': 545, 'move_amp': 35, 'move_speed': 0.022},
-                    # P2 hop platform (moving — mirrors P1 hop)
-                    # {'x': 565, 'y': 310, 'w': 80,  'h': 16, 'color': '#5a5a5a', 'shadow': '#2e2e2e',
-                    #  'moving': True, 'move_center_x': 565, 'move_amp': 25, 'move_speed': 0.020},
-                    # P2 spawn platform — anchored to right wall
-                    {'x': 674, 'y': 365, 'w': 110, 'h': 16, 'color': '#6b6b6b', 'shadow': '#3a3a3a'},
-                    #  Goal platform (against right wall)
-                    {'x': 16, 'y': 125, 'w': 48,  'h': 16, 'color': '#4a4a4a', 'shadow': '#222222'},
-                ],
-                # Two doors: one blocking each player from the middle.
-                # Both permanently open when all duo door plates triggered simultaneously.
-                'doors': [
-                    {'x': 295, 'y': 0, 'w': 20, 'h': 420},  # Left door
-                    {'x': 485, 'y': 0, 'w': 20, 'h': 420},  # Right door
-                ],
-                'pressure_plates': [
-                    # P1 plate — tracks P1 door platform (same amp/speed, +8px offset)
-                    {'x': 158, 'y': 237, 'w': 60, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1',
-                     'moving': True, 'move_center_x': 158, 'move_amp': 35, 'move_speed': 0.022},
-                    # P2 plate — tracks P2 door platform (same amp/speed, +8px offset)
-                    {'x': 552, 'y': 237, 'w': 60, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2',
-                     'moving': True, 'move_center_x': 552, 'move_amp': 35, 'move_speed': 0.022},
-                ],
-                'goal_plates': [
-                    # P1 ★ plate — static
-                    {'x': 323, 'y': 292, 'w': 60, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p1'},
-                    # P2 ★ plate — static
-                    {'x': 418, 'y': 292, 'w': 60, 'h': 8, 'active': False, 'triggered': False, 'duo': True, 'player': 'p2'},
-                ],
-                'goal_locked': True,
-                # Goal appears on the upper central platform when both ★ plates triggered
-                'goal': {'x': 16, 'y': 75, 'w': 48, 'h': 45},
-            }
+            'moving': moving,
+            'flags': flags,
         }
-        return levels.get(n, levels[1])
 
     def serialize(self):
+        template, level = self.template, self.level
         return {
+            'tick': self.tick,
             'players': {
                 pid: {
                     'x': p.x, 'y': p.y,
@@ -491,18 +621,123 @@ class GameState:
                 for pid, p in self.players.items()
             },
             'level': {
-                'tiles': self.level['tiles'],
-                'theme': self.level.get('theme'),
-                'doors': self.level.get('doors', []),
+                'tiles': [self._tile(i, t) for i, t in enumerate(level['tiles'])],
+                'theme': level.get('theme'),
+                'doors': [dict(d) for d in level.get('doors', ())],
                 'pressure_plates': [
-                    {**pl, 'player': pl.get('player'), 'duo': pl.get('duo', False)}
-                    for pl in self.level.get('pressure_plates', [])
+                    {**self._plate(i, pl), 'player': pl.get('player'), 'duo': pl.get('duo', False)}
+                    for i, pl in zip(template.door_plates, level.get('pressure_plates', ()))
                 ],
-                'goal_plate': self.level.get('goal_plate'),
-                'goal_plates': self.level.get('goal_plates', []),
-                'goal_door': self.level.get('goal_door'),
-                'goal': self.level['goal'],
-                'goal_locked': self.level.get('goal_locked', True),
-                'doors_open': self._all_plates_active()
+                'goal_plate': self._plate(template.goal_plate, level['goal_plate']) if level.get('goal_plate') else None,
+                'goal_plates': [self._plate(i, gp) for i, gp in zip(template.goal_plates, level.get('goal_plates', ()))],
+                'goal_door': dict(level['goal_door']) if level.get('goal_door') else None,
+                'goal': dict(level['goal']),
+                'goal_locked': self.goal_locked,
+                'doors_open': self.doors_open
             }
-        }
\ No newline at end of file
+        }
+
+    def _tile(self, i, tile):
+        """Plain copy of shared tile i, at its current x if it moves."""
+        tile = dict(tile)
+        mi = self.template.colliders[i][4]  # tiles come first in colliders
+        if mi >= 0:
+            tile['x'] = self.moving_x[mi]
+        return tile
+
+    def _plate(self, i, plate):
+        """Plain copy of shared plate i with its current x and flags."""
+        plate = dict(plate, active=self.active[i], triggered=self.triggered[i])
+        mi = self.template.plates[i][4]
+        if mi >= 0:
+            plate['x'] = self.moving_x[mi]
+        return plate
+
+
+class SnapshotRing:
+    """The last `size` snapshots of one GameState, for rollback and retries.
+
+    Call save() after each update() you may want to return to; rewind(tick)
+    restores that tick and forgets every later snapshot.
+    """
+
+    def __init__(self, state, size=120):
+        self.state = state
+        self.snapshots = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def save(self):
+        self.snapshots.append(self.state.snapshot())
+
+    def ticks(self):
+        return [snap[0] for snap in self.snapshots]
+
+    def rewind(self, tick):
+        """Restores the snapshot taken at `tick`. Returns False if it is not kept."""
+        snaps = self.snapshots
+        while snaps and snaps[-1][0] > tick:
+            snaps.pop()
+        if not snaps or snaps[-1][0] != tick:
+            return False
+        self.state.restore(snaps[-1])
+        return True
+
+
+# ── Equivalence check for quiet-tick skipping ──────────────────────────────
+
+def verify_quiet(runs=4, ticks=3000, seed=0):
+    """Replays idle-heavy input traces with and without skipping; returns mismatches.
+
+    Players mostly stand still for long stretches, with short bursts of
+    random keys between them. Every other run drops them onto the path of a
+    moving tile or plate, where a wrong skip would show. Every tick the
+    frame, deltas against a few earlier ticks and check_win() must be
+    identical.
+    """
+    mismatches = []
+    for collision in COLLISIONS:
+        for num_players in (1, 2):
+            for level in (1, 2, 3):
+                for run in range(runs):
+                    rng = random.Random(seed * 1000 + num_players * 100 + level * 10 + run)
+                    fast = GameState('F', num_players, level, collision)
+                    full = GameState('F', num_players, level, collision)
+                    full.skip_quiet = False
+                    sweep = fast.template.moving_sweep
+                    if run % 2 and sweep:
+                        for pid in fast.players:
+                            x0, y0, x1, _ = rng.choice(sweep)
+                            x, y = rng.uniform(x0 - PLAYER_W, x1), y0 - PLAYER_H - rng.uniform(0, 80)
+                            for state in (fast, full):
+                                state.players[pid].x, state.players[pid].y = x, y
+                    held, left = {}, 0
+                    for t in range(ticks):
+                        if left <= 0:
+                            idle = rng.random() < 0.6
+                            held = {pid: {} if idle else {'left': rng.random() < 0.35,
+                                                          'right': rng.random() < 0.5,
+                                                          'jump': rng.random() < 0.3}
+                                    for pid in fast.players}
+                            left = rng.randint(20, 150) if idle else rng.randint(1, 30)
+                        left -= 1
+                        for state in (fast, full):
+                            for pid, keys in held.items():
+                                state.apply_input(pid, keys)
+                            state.update()
+                        since = (0, max(0, t - 30), t)
+                        if (fast.serialize() != full.serialize() or
+                                fast.check_win() != full.check_win() or
+                                any(fast.serialize_delta(s) != full.serialize_delta(s) for s in since)):
+                            mismatches.append((collision, num_players, level, run, t))
+                            break
+    return mismatches
+
+
+if __name__ == '__main__':
+    bad = verify_quiet()
+    for collision, num_players, level, run, t in bad[:10]:
+        print(f'mismatch: {collision} players={num_players} level={level} run={run} tick={t}')
+    print('skipping quiet ticks matches full simulation' if not bad else f'{len(bad)} mismatching runs')
+    sys.exit(1 if bad else 0)
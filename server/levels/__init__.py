@@ -0,0 +1,290 @@
+"""Level files and the compile-once level cache.
+
+Each level lives in this folder as `<solo|duo>_<n>.json`. A file is read,
+validated and compiled into an immutable LevelTemplate the first time it is
+asked for; after that every GameState on that level shares the one template
+and keeps only its own small block of mutable state.
+
+Any object may carry a "note" string documenting it. Notes are stripped at
+compile time and never reach the game state or the client.
+"""
+import functools
+import json
+import os
+from types import MappingProxyType
+
+from spatial import SpatialGrid
+from trajectory import TrajectoryTable
+
+LEVEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Top-level keys a level file may use; anything else is a typo
+LEVEL_KEYS = {'description', 'theme', 'death_y', 'spawns', 'tiles', 'doors', 'pressure_plates',
+              'goal_plate', 'goal_plates', 'goal_door', 'goal_locked', 'goal'}
+RECT_LISTS = ('tiles', 'doors', 'pressure_plates', 'goal_plates')
+RECTS = ('goal_plate', 'goal_door', 'goal')
+PLATES = ('pressure_plates', 'goal_plates', 'goal_plate')
+MOVE_KEYS = ('move_center_x', 'move_amp', 'move_speed')
+
+
+class LevelError(ValueError):
+    """A level file is missing or malformed."""
+
+
+# Collider solidity rules (see LevelTemplate.colliders); a value >= 0 is a
+# plate index, and that collider is solid until the plate is triggered.
+ALWAYS, DOORS_CLOSED, GOAL_LOCKED = -1, -2, -3
+
+# What a trigger does when it fires (see LevelTemplate.triggers)
+OPENS_DOORS, UNLOCKS_GOAL = 0, 1
+
+
+class LevelTemplate:
+    """A validated, read-only level. Shared by every session that plays it.
+
+    Besides the frozen level data, the template carries the geometry
+    compiled into flat tuples, so sessions only have to hold the parts that
+    change while playing (see GameState):
+
+    colliders   (x, y, w, h, moving index or -1, solid rule) in the order
+                collisions are resolved: tiles, doors, pressure plates,
+                goal plate, goal plates, goal door
+    plates      (x, y, w, h, moving index or -1, duo, player) for the
+                pressure plates, then the goal plate, then the goal plates
+    moving      (move_center_x, move_amp, move_speed) per oscillating
+                tile or pressure plate, with moving_refs giving the
+                (group, index) each one belongs to and moving_sweep the
+                (x0, y0, x1, y1) box it can cover over a whole oscillation,
+                from trajectory.bounds()
+    triggers    (plate indices, every plate needed, effect, any plate moves)
+                in the order they are evaluated: each solo door plate on
+                its own, the duo door plates together, the goal plate, then
+                the goal plates together. A trigger needing every plate
+                fires when each plate's assigned player stands on it at
+                once; otherwise any player on the plate fires it. effect
+                is OPENS_DOORS or UNLOCKS_GOAL
+    trajectory  TrajectoryTable with the x of every moving entry per tick
+    """
+
+    __slots__ = ('mode', 'number', 'data', 'spawns', 'death_y', 'goal',
+                 'colliders', 'plates', 'door_plates', 'goal_plate', 'goal_plates',
+                 'moving', 'moving_refs', 'moving_x', 'moving_sweep',
+                 'trajectory', 'triggers', '_grids')
+
+    def __init__(self, mode, number, data):
+        self.mode = mode
+        self.number = number
+        self.data = _freeze(data)
+        self.spawns = tuple((sp['x'], sp['y']) for sp in data.get('spawns', ()))
+        self.death_y = data.get('death_y', 600)
+        g = data['goal']
+        self.goal = (g['x'], g['y'], g['w'], g['h'])
+
+        moving, refs, start_x, extents = [], [], [], []
+        def mover(group, i, rect):
+            # Only tiles and pressure plates are animated
+            if not rect.get('moving') or group not in ('tiles', 'pressure_plates'):
+                return -1
+            moving.append((rect['move_center_x'], rect['move_amp'], rect['move_speed']))
+            refs.append((group, i))
+            start_x.append(rect['x'])
+            extents.append((rect['y'], rect['w'], rect['h']))
+            return len(moving) - 1
+
+        plates = []
+        def plate(group, i, rect):
+            plates.append((rect['x'], rect['y'], rect['w'], rect['h'], mover(group, i, rect),
+                           bool(rect.get('duo')), rect.get('player')))
+            return len(plates) - 1
+
+        colliders = []
+        for i, t in enumerate(data['tiles']):
+            colliders.append((t['x'], t['y'], t['w'], t['h'], mover('tiles', i, t), ALWAYS))
+        for d in data.get('doors', []):
+            colliders.append((d['x'], d['y'], d['w'], d['h'], -1, DOORS_CLOSED))
+        door_plates = [plate('pressure_plates', i, pl) for i, pl in enumerate(data.get('pressure_plates', []))]
+        goal_plate = plate('goal_plate', None, data['goal_plate']) if data.get('goal_plate') else None
+        goal_plates = [plate('goal_plates', i, gp) for i, gp in enumerate(data.get('goal_plates', []))]
+        for i in door_plates + ([goal_plate] if goal_plate is not None else []) + goal_plates:
+            x, y, w, h, mi = plates[i][:5]
+            colliders.append((x, y, w, h, mi, i))
+        if data.get('goal_door'):
+            d = data['goal_door']
+            colliders.append((d['x'], d['y'], d['w'], d['h'], -1, GOAL_LOCKED))
+
+        self.colliders = tuple(colliders)
+        self.plates = tuple(plates)
+        self.door_plates = tuple(door_plates)
+        self.goal_plate = goal_plate
+        self.goal_plates = tuple(goal_plates)
+        self.moving = tuple(moving)
+        self.moving_refs = tuple(refs)
+        self.moving_x = tuple(start_x)
+        self.trajectory = TrajectoryTable(self.moving, self.moving_x)
+        sweep = []
+        for mi, (y, w, h) in enumerate(extents):
+            x0, x1 = self.trajectory.bounds(mi)
+            sweep.append((x0, y, x1 + w, y + h))
+        self.moving_sweep = tuple(sweep)
+
+        triggers = [((i,), False, OPENS_DOORS) for i in door_plates if not plates[i][5]]
+        duo = tuple(i for i in door_plates if plates[i][5])
+        if duo:
+            triggers.append((duo, True, OPENS_DOORS))
+        if goal_plate is not None:
+            triggers.append(((goal_plate,), False, UNLOCKS_GOAL))
+        if goal_plates:
+            triggers.append((tuple(goal_plates), True, UNLOCKS_GOAL))
+        self.triggers = tuple(t + (any(plates[i][4] >= 0 for i in t[0]),) for t in triggers)
+        self._grids = {}
+
+    def solid_ids(self, doors_closed, goal_locked, triggered):
+        """Indices of the colliders that are solid for the given trigger state."""
+        ids = []
+        for i, c in enumerate(self.colliders):
+            rule = c[5]
+            if (rule == ALWAYS or (rule == DOORS_CLOSED and doors_closed) or
+                    (rule == GOAL_LOCKED and goal_locked) or (rule >= 0 and not triggered[rule])):
+                ids.append(i)
+        return tuple(ids)
+
+    def grid(self, solid_ids):
+        """Broad-phase grid over the given solid colliders, shared across sessions."""
+        grid = self._grids.get(solid_ids)
+        if grid is None:
+            grid = self._grids[solid_ids] = SpatialGrid()
+            grid.build(self._boxes(solid_ids))
+        return grid
+
+    def _boxes(self, solid_ids):
+        # Moving colliders cover the whole span they can sweep
+        for i in solid_ids:
+            x, y, w, h, mi, _ = self.colliders[i]
+            if mi >= 0:
+                yield (i,) + self.moving_sweep[mi]
+            else:
+                yield i, x, y, x + w, y + h
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def level_path(mode, number):
+    return os.path.join(LEVEL_DIR, f'{mode}_{number}.json')
+
+
+def available(mode):
+    """Sorted level numbers that have a file for the given mode."""
+    numbers = []
+    for name in os.listdir(LEVEL_DIR):
+        stem, ext = os.path.splitext(name)
+        prefix, _, number = stem.partition('_')
+        if ext == '.json' and prefix == mode and number.isdigit():
+            numbers.append(int(number))
+    return sorted(numbers)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(mode, number):
+    """Reads, validates and compiles one level file. Cached per (mode, number)."""
+    path = level_path(mode, number)
+    try:
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        raise LevelError(f'no level file {os.path.basename(path)}') from None
+    except json.JSONDecodeError as e:
+        raise LevelError(f'{os.path.basename(path)}: {e}') from None
+    return LevelTemplate(mode, number, compile_level(raw, os.path.basename(path)))
+
+
+def get_level(num_players, number):
+    """Template for a solo (1 player) or duo (2+) level; unknown numbers fall back to level 1."""
+    # int() so that 2 and '2' share one cache entry and one template
+    return _resolve('duo' if num_players >= 2 else 'solo', int(number))
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve(mode, number):
+    if not os.path.exists(level_path(mode, number)):
+        number = 1
+    return load_template(mode, number)
+
+
+def load_all():
+    """Compiles every level up front so a bad file fails at startup, not mid-game."""
+    return [load_template(mode, n) for mode in ('solo', 'duo') for n in available(mode)]
+
+
+# ── Validation ─────────────────────────────────────────────────────────────
+
+def compile_level(raw, name='level'):
+    """Validates a raw level dict and returns a normalized copy."""
+    if not isinstance(raw, dict):
+        raise LevelError(f'{name}: top level must be an object')
+    unknown = set(raw) - LEVEL_KEYS
+    if unknown:
+        raise LevelError(f'{name}: unknown keys {sorted(unknown)}')
+    for key in ('tiles', 'goal'):
+        if key not in raw:
+            raise LevelError(f'{name}: missing "{key}"')
+
+    level = {}
+    for key, value in raw.items():
+        where = f'{name}: {key}'
+        if key in RECT_LISTS:
+            if not isinstance(value, list):
+                raise LevelError(f'{where} must be a list')
+            level[key] = [_rect(r, f'{where}[{i}]', key in PLATES) for i, r in enumerate(value)]
+        elif key in RECTS:
+            level[key] = _rect(value, where, key in PLATES)
+        elif key == 'spawns':
+            if not isinstance(value, list):
+                raise LevelError(f'{where} must be a list')
+            level[key] = [_point(p, f'{where}[{i}]') for i, p in enumerate(value)]
+        elif key == 'death_y':
+            level[key] = _number(value, where)
+        elif key == 'goal_locked':
+            if not isinstance(value, bool):
+                raise LevelError(f'{where} must be true or false')
+            level[key] = value
+        elif key != 'description':
+            level[key] = value
+    level.setdefault('goal_locked', True)
+    return level
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise LevelError(f'{where} must be a number')
+    return value
+
+
+def _point(raw, where):
+    if not isinstance(raw, dict):
+        raise LevelError(f'{where} must be an object')
+    return {'x': _number(raw.get('x'), f'{where}.x'), 'y': _number(raw.get('y'), f'{where}.y')}
+
+
+def _rect(raw, where, is_plate):
+    if not isinstance(raw, dict):
+        raise LevelError(f'{where} must be an object')
+    rect = {k: v for k, v in raw.items() if k != 'note'}
+    for k in ('x', 'y', 'w', 'h'):
+        _number(rect.get(k), f'{where}.{k}')
+    if rect['w'] <= 0 or rect['h'] <= 0:
+        raise LevelError(f'{where} must have positive w and h')
+    if rect.get('moving'):
+        for k in MOVE_KEYS:
+            _number(rect.get(k), f'{where}.{k}')
+    if 'player' in rect and rect['player'] not in ('p1', 'p2'):
+        raise LevelError(f'{where}.player must be "p1" or "p2"')
+    if is_plate:
+        rect.setdefault('active', False)
+        rect.setdefault('triggered', False)
+    return rect
@@ -0,0 +1,506 @@
+"""End-to-end load test: many simulated browser clients against a local server.
+
+    python app.py &                                      # or shards.py
+    python loadgen.py --ramp 50,100,200,400 --stage 10 --pid <server pid>
+
+Each client starts a game the way client/js/main.js does (solo or duo, a
+random level) and then plays at the client's 30 Hz cadence with scripted
+key presses: walking, jumping, standing still. How it talks to the server:
+
+    http    POST /api/input every tick and read back the delta frame (default)
+    batch   client clock: POST /api/input_batch with the last 4 ticks
+    socket  Socket.IO over a websocket: inputs when keys change, frames
+            pushed by the server. Needs simple-websocket (installed with
+            Flask-SocketIO); frames are JSON in this mode.
+
+Clients are added stage by stage and stay connected until the end. For
+every stage it reports request latency percentiles (for sockets, the time
+until the server acknowledges an input), error rate, requests per second,
+the tick rate clients actually managed (for sockets, frames pushed to each
+client per second), and the CPU
+and RSS of the server (--pid, children included, so the shards.py router
+covers its workers; read with psutil if it is installed, otherwise from
+/proc on Linux) and of the load generator itself. The first stage
+whose p99 exceeds one tick, whose clients fall behind, or whose errors
+pass 1% is reported as the saturation point.
+
+The load generator shares the machine with the server, so keep an eye on
+its own CPU column: once it is near 100% of a core, its numbers say more
+about itself than about the server.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+import wire
+
+try:
+    import simple_websocket
+except ImportError:  # optional, only the socket transport needs it
+    simple_websocket = None
+
+try:
+    import psutil
+except ImportError:  # optional; without it --pid reads /proc, which only Linux has
+    psutil = None
+
+TICK_HZ = 30
+TICK = 1 / TICK_HZ
+BATCH_TICKS = 4              # main.js sends a client-clocked batch every 4 ticks
+MAX_BATCH = 90               # most ticks the server takes in one batch (app.MAX_BATCH)
+SATURATED_BEHIND = 0.9       # clients managing less than this share of TICK_HZ
+SATURATED_ERRORS = 0.01      # error share of requests
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+# ── Scripted players ─────────────────────────────────────────────────────
+class Script:
+    """Held keys for one player, changing every so often like a person playing."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.keys = {'left': False, 'right': False, 'jump': False}
+        self.left = 0
+
+    def next(self):
+        rng = self.rng
+        if self.left <= 0:
+            roll = rng.random()
+            walk = 'right' if roll < 0.5 else 'left' if roll < 0.7 else None  # mostly heading right
+            self.keys = {'left': walk == 'left', 'right': walk == 'right', 'jump': False}
+            self.left = rng.randint(15, 90) if walk else rng.randint(10, 60)
+        self.left -= 1
+        # Jump taps last a few ticks, as key presses do
+        if self.keys['jump']:
+            self.keys['jump'] = rng.random() < 0.7
+        elif rng.random() < 0.03:
+            self.keys['jump'] = True
+        return dict(self.keys)
+
+
+# ── Measurements ─────────────────────────────────────────────────────────
+class Stage:
+    """Latencies and errors recorded while this stage ran. list.append is atomic, so no lock."""
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.latencies = []  # seconds
+        self.errors = []     # short reason per failed request
+
+
+class ProcessSampler:
+    """CPU time and RSS of a process and its children, from psutil or /proc.
+
+    With neither (macOS or Windows without psutil) there is nothing to
+    sample and the server columns show '-'.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.clk_tck = os.sysconf('SC_CLK_TCK') if psutil is None and os.path.isdir('/proc') else None
+
+    @property
+    def available(self):
+        return psutil is not None or self.clk_tck is not None
+
+    def sample(self):
+        """(cpu seconds, rss bytes) summed over the tree; None if the process is gone."""
+        if psutil is not None:
+            return self._sample_psutil()
+        if self.clk_tck is None:
+            return None
+        try:
+            return self._sample_proc()
+        except OSError:
+            return None
+
+    def _sample_psutil(self):
+        try:
+            root = psutil.Process(self.pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        cpu = rss = 0
+        for proc in procs:
+            try:
+                times = proc.cpu_times()
+                cpu += times.user + times.system
+                rss += proc.memory_info().rss
+            except psutil.Error:
+                if proc.pid == self.pid:
+                    return None
+        return cpu, rss
+
+    def _tree(self):
+        pids, parents = {self.pid}, {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as f:
+                        parents[int(entry)] = int(f.read().rpartition(')')[2].split()[1])
+                except OSError:
+                    continue
+        grew = True
+        while grew:
+            children = {pid for pid, ppid in parents.items() if ppid in pids} - pids
+            pids |= children
+            grew = bool(children)
+        return pids
+
+    def _sample_proc(self):
+        cpu = rss = 0
+        for pid in self._tree():
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rpartition(')')[2].split()
+                with open(f'/proc/{pid}/status') as f:
+                    kb = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0)
+            except OSError:
+                if pid == self.pid:
+                    return None
+                continue
+            cpu += (int(fields[11]) + int(fields[12])) / self.clk_tck  # utime + stime
+            rss += kb * 1024
+        return cpu, rss
+
+
+# ── Clients ──────────────────────────────────────────────────────────────
+class Client(threading.Thread):
+    def __init__(self, index, args, recorder, stop):
+        super().__init__(daemon=True, name=f'client-{index}')
+        self.args = args
+        self.recorder = recorder  # recorder[0] is the Stage currently running
+        self.stop = stop
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.mode = {'solo': 1, 'duo': 2}.get(args.mode) or self.rng.choice((1, 2))
+        self.level = self.rng.choice(args.levels)
+        self.scripts = [Script(self.rng) for _ in range(self.mode)]
+        self.conn = None
+        self.port = args.port  # the session's worker behind shards.py --direct
+        self.session_id = None
+        self.since = None  # tick of the newest frame, as main.js keeps it
+        self.seq = 0
+        self.requests = 0  # counters only this thread writes; run() sums them per stage
+        self.ticks = 0
+        self.started = time.perf_counter()
+
+    def inputs(self):
+        return {f'p{i + 1}': s.next() for i, s in enumerate(self.scripts)}
+
+    # HTTP
+    def post(self, path, body, content_type='application/json'):
+        """(status, body, content type), or None after a transport error, which is recorded."""
+        stage = self.recorder[0]
+        self.requests += 1
+        start = time.perf_counter()
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.args.host, self.port, timeout=self.args.timeout)
+            try:
+                self.conn.request('POST', path, body=body, headers={'Content-Type': content_type})
+                resp = self.conn.getresponse()
+                data = resp.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = None
+                if attempt or isinstance(e, TimeoutError):
+                    stage.errors.append(type(e).__name__)
+                    return None
+        stage.latencies.append(time.perf_counter() - start)
+        if resp.status != 200:
+            stage.errors.append(f'HTTP {resp.status}')
+        return resp.status, data, resp.getheader('Content-Type', '')
+
+    def read_frame(self, reply):
+        status, data, content_type = reply
+        if status != 200:
+            return
+        if content_type.startswith(wire.CONTENT_TYPE):
+            self.since = struct.unpack_from('<I', data, 2)[0]
+        else:
+            self.since = json.loads(data)['tick']
+
+    def start_game(self, clock='server'):
+        body = json.dumps({'mode': self.mode, 'level': self.level,
+                           'encoding': self.args.encoding, 'clock': clock})
+        reply = self.post('/api/start_game', body)
+        if reply and reply[0] == 200:
+            data = json.loads(reply[1])
+            self.session_id = data['session_id']
+            if data.get('port'):  # play on the session's worker, as main.js does
+                self.port = data['port']
+                self.conn.close()
+                self.conn = None
+        return self.session_id is not None
+
+    def end_game(self):
+        if self.session_id:
+            self.post('/api/end_game', json.dumps({'session_id': self.session_id}))
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            getattr(self, f'run_{self.args.transport}')()
+        finally:
+            if self.conn:
+                self.conn.close()
+
+    def paced(self, wait=time.sleep):
+        """Yields once per tick at TICK_HZ until stopped, skipping ticks it is too late for.
+
+        wait(seconds) fills the time until the next tick.
+        """
+        next_at = time.perf_counter()
+        while not self.stop.is_set():
+            yield
+            next_at += TICK
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                wait(delay)
+            else:
+                next_at += (-delay // TICK) * TICK  # drop the ticks we missed
+
+    def run_http(self):
+        if not self.start_game():
+            return
+        binary = self.args.encoding == 'binary'
+        for _ in self.paced():
+            self.ticks += 1
+            self.seq += 1
+            inputs = self.inputs()
+            if binary:
+                body = struct.pack('<8siiB', self.session_id.encode(), -1 if self.since is None else self.since,
+                                   self.seq, wire.pack_inputs(inputs))
+                reply = self.post('/api/input', body, wire.CONTENT_TYPE)
+            else:
+                reply = self.post('/api/input', json.dumps({'session_id': self.session_id, 'inputs': inputs,
+                                                            'tick': self.since, 'seq': self.seq}))
+            if reply:
+                self.read_frame(reply)
+        self.end_game()
+
+    def run_batch(self):
+        if not self.start_game(clock='client'):
+            return
+        binary = self.args.encoding == 'binary'
+        batch = []
+        for _ in self.paced():
+            self.ticks += 1
+            batch.append(self.inputs())
+            if len(batch) < BATCH_TICKS:
+                continue
+            first = self.seq + 1
+            if binary:
+                body = struct.pack('<8sii', self.session_id.encode(), -1 if self.since is None else self.since,
+                                   first) + bytes(wire.pack_inputs(i) for i in batch)
+                reply = self.post('/api/input_batch', body, wire.CONTENT_TYPE)
+            else:
+                reply = self.post('/api/input_batch', json.dumps({'session_id': self.session_id, 'tick': self.since,
+                                                                  'seq': first, 'inputs': batch}))
+            if reply:
+                self.read_frame(reply)
+                if reply[0] == 200:
+                    self.seq += len(batch)
+                    batch = []
+            if len(batch) > MAX_BATCH:  # the server refuses bigger batches; give up the oldest ticks
+                self.seq += len(batch) - MAX_BATCH
+                del batch[:-MAX_BATCH]
+        self.end_game()
+
+    def run_socket(self):
+        if not self.start_game():
+            return
+        stage = self.recorder[0]
+        url = (f'ws://{self.args.host}:{self.port}/socket.io/'
+               f'?EIO=4&transport=websocket&session_id={self.session_id}')
+        try:
+            ws = simple_websocket.Client.connect(url)
+            # Inputs are tiny; with Nagle each would wait for the ACK of the last one
+            ws.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            ws.receive(timeout=self.args.timeout)  # engine.io open packet
+            ws.send('40')
+            ws.send('42' + json.dumps(['join', {'session_id': self.session_id}]))
+        except Exception as e:  # simple_websocket raises its own ConnectionError types
+            stage.errors.append(type(e).__name__)
+            self.end_game()
+            return
+        sent = {}  # seq -> send time, until the server acknowledges that input
+        ended = []
+
+        def wait(seconds):
+            # Read whatever arrives until the next tick is due
+            deadline = time.perf_counter() + seconds
+            while (left := deadline - time.perf_counter()) > 0:
+                msg = ws.receive(timeout=left)
+                if msg is None:
+                    return
+                if msg == '2':
+                    ws.send('3')  # engine.io ping
+                elif msg.startswith('42["state"'):
+                    self.ticks += 1  # frames pushed, the server's tick rate as this client sees it
+                elif msg.startswith('43'):
+                    seq = int(msg[2:msg.index('[')])
+                    if seq in sent:
+                        self.recorder[0].latencies.append(time.perf_counter() - sent.pop(seq))
+                elif msg.startswith('42["ended"'):
+                    ended.append(True)
+                    self.stop.wait(seconds)
+                    return
+
+        last = None
+        try:
+            for _ in self.paced(wait):
+                if ended:
+                    return
+                stage = self.recorder[0]
+                inputs = self.inputs()
+                self.seq += 1
+                if inputs != last:  # main.js only pushes changes
+                    last = inputs
+                    self.requests += 1
+                    sent[self.seq] = time.perf_counter()
+                    # With an ack id the server answers 43<id> once the input is handled
+                    ws.send(f'42{self.seq}' + json.dumps(['input', {'session_id': self.session_id,
+                                                                   'inputs': inputs, 'seq': self.seq}]))
+                for seq in [s for s, t in sent.items() if time.perf_counter() - t > self.args.timeout]:
+                    del sent[seq]
+                    stage.errors.append('no ack')
+        except Exception as e:  # simple_websocket.ConnectionClosed and friends
+            self.recorder[0].errors.append(type(e).__name__)
+        finally:
+            ws.close()
+            self.end_game()
+
+
+# ── Ramp ─────────────────────────────────────────────────────────────────
+def summarize(stage, requests, tick_hz, seconds, server, loadgen):
+    lat = stage.latencies
+    report = {
+        'clients': stage.clients,
+        'requests_per_s': round(requests / seconds, 1),
+        'tick_hz': round(tick_hz, 1),
+        'p50_ms': round(percentile(lat, 50) * 1000, 2),
+        'p95_ms': round(percentile(lat, 95) * 1000, 2),
+        'p99_ms': round(percentile(lat, 99) * 1000, 2),
+        'error_rate': round(len(stage.errors) / max(requests, 1), 4),
+        'errors': {e: stage.errors.count(e) for e in sorted(set(stage.errors))},
+        'loadgen_cpu_pct': round(loadgen * 100, 1),
+    }
+    if server:
+        report['server_cpu_pct'] = round(server[0] * 100, 1)
+        report['server_rss_mb'] = round(server[1] / 2**20, 1)
+    report['saturated'] = (report['p99_ms'] > TICK * 1000 or report['tick_hz'] < TICK_HZ * SATURATED_BEHIND or
+                           report['error_rate'] > SATURATED_ERRORS)
+    return report
+
+
+def run(args):
+    sampler = ProcessSampler(args.pid) if args.pid else None
+    if sampler and not sampler.available:
+        print('--pid: server CPU and RSS need psutil on this platform (pip install psutil)', file=sys.stderr)
+        sampler = None
+    stop = threading.Event()
+    recorder = [Stage(0)]
+    clients = []
+    reports = []
+    threading.stack_size(256 * 1024)  # thousands of client threads
+    try:
+        for target in args.ramp:
+            stage = recorder[0] = Stage(target)
+            counts = [(c.requests, c.ticks) for c in clients]
+            before = sampler.sample() if sampler else None
+            own = time.process_time()
+            start = time.perf_counter()
+            # Spread new clients over the first second so they do not start in lockstep
+            new = [Client(i, args, recorder, stop) for i in range(len(clients), target)]
+            for client in new:
+                client.start()
+                time.sleep(min(1.0, args.stage / 4) / max(len(new), 1))
+            clients += new
+            counts += [(0, 0)] * len(new)
+            time.sleep(max(0.0, start + args.stage - time.perf_counter()))
+            end = time.perf_counter()
+            after = sampler.sample() if sampler else None
+            seconds = end - start
+            requests = sum(c.requests - r for c, (r, _) in zip(clients, counts))
+            ticks = sum(c.ticks - t for c, (_, t) in zip(clients, counts))
+            played = sum(end - max(start, c.started) for c in clients)  # client-seconds in this stage
+            server = None
+            if before and after:
+                server = ((after[0] - before[0]) / seconds, after[1])
+            report = summarize(stage, requests, ticks / max(played, 1e-9), seconds, server,
+                               (time.process_time() - own) / seconds)
+            reports.append(report)
+            if not args.json:
+                if len(reports) == 1:
+                    print(''.join(f'{h:>11}' for h in HEADER))
+                print_row(report)
+            if args.stop_when_saturated and report['saturated']:
+                break
+    finally:
+        stop.set()
+        for client in clients:
+            client.join(args.timeout + 2)
+    return reports
+
+
+HEADER = ('clients', 'req/s', 'tick Hz', 'p50 ms', 'p95 ms', 'p99 ms', 'errors', 'srv CPU%', 'srv RSS MB', 'gen CPU%')
+
+
+def print_row(r):
+    cells = (r['clients'], r['requests_per_s'], r['tick_hz'], r['p50_ms'], r['p95_ms'], r['p99_ms'],
+             f"{r['error_rate']:.1%}", r.get('server_cpu_pct', '-'), r.get('server_rss_mb', '-'),
+             r['loadgen_cpu_pct'])
+    print(''.join(f'{c:>11}' for c in cells) + ('   saturated' if r['saturated'] else ''), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate many browser clients against a running server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--transport', choices=('http', 'batch', 'socket'), default='http')
+    parser.add_argument('--encoding', choices=wire.ENCODINGS, default='json')
+    parser.add_argument('--mode', choices=('solo', 'duo', 'mixed'), default='mixed')
+    parser.add_argument('--levels', default='1,2,3', help='levels to pick from, e.g. 1,3')
+    parser.add_argument('--ramp', default='10,50,100,200', help='client counts, one stage each')
+    parser.add_argument('--stage', type=float, default=10,
+                        help='seconds per stage, new clients joining during its first second')
+    parser.add_argument('--pid', type=int, help='server process to sample CPU and RSS of (children included)')
+    parser.add_argument('--timeout', type=float, default=5, help='seconds before a request counts as failed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stop-when-saturated', action='store_true')
+    parser.add_argument('--json', action='store_true', help='print the per-stage report as JSON')
+    args = parser.parse_args(argv)
+    args.ramp = sorted(int(n) for n in args.ramp.split(','))
+    args.levels = [int(n) for n in args.levels.split(',')]
+    if args.transport == 'socket':
+        if simple_websocket is None:
+            parser.error('the socket transport needs simple-websocket (pip install simple-websocket)')
+        args.encoding = 'json'
+
+    reports = run(args)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        saturated = next((r['clients'] for r in reports if r['saturated']), None)
+        print(f'saturated at {saturated} clients' if saturated else
+              f'not saturated at {reports[-1]["clients"]} clients' if reports else 'no stages run')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Latency histograms for the tick phases, rendered in Prometheus text format.
+
+Off unless METRICS=1. When off nothing is wrapped, so the game runs exactly
+the same code as without this module. instrument() swaps timed wrappers
+onto GameState and the Flask JSON provider:
+
+    update_integrate      gravity, movement, death check and flag bookkeeping
+    update_resolve_x      one _resolve_x call (per player)
+    update_resolve_y      one _resolve_y call (per player)
+    update_animate        moving tile / plate animation during update()
+    update_plates         _update_pressure_plates
+    serialize             GameState.serialize
+    json_encode           Flask response JSON encoding
+    api_input             the whole /api/input handler (see timed())
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask.json.provider import DefaultJSONProvider
+
+enabled = os.environ.get('METRICS') == '1'
+
+# Upper bounds in seconds, from 1 microsecond up to 100 milliseconds
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+           1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 1e-1)
+
+UPDATE_PHASES = {
+    '_resolve_x': 'update_resolve_x',
+    '_resolve_y': 'update_resolve_y',
+    '_animate_moving': 'update_animate',
+    '_update_pressure_plates': 'update_plates',
+}
+
+
+class Histogram:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        running = 0
+        for bound, count in zip(BUCKETS, counts):
+            running += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {running}')
+        running += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {running}')
+        lines.append(f'{self.name}_sum {total:.9f}')
+        lines.append(f'{self.name}_count {running}')
+        return lines
+
+
+histograms = {}
+_rates = {}  # gauge name -> (time, counter value) at the previous scrape
+_started = time.monotonic()
+
+
+def histogram(key):
+    h = histograms.get(key)
+    if h is None:
+        h = histograms[key] = Histogram(f'puzzle_{key}_seconds', f'Latency of {key}')
+    return h
+
+
+def timed(key, fn):
+    """Wraps fn so every call is recorded in the `key` histogram."""
+    h = histogram(key)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            h.observe(time.perf_counter() - start)
+    return wrapper
+
+
+# ── Instrumentation ──────────────────────────────────────────────────────
+# Time spent inside the phase wrappers during the current update(), so the
+# remainder can be reported as integration. update() runs on the scheduler
+# thread and, for client-clocked sessions, in step_batch() on request
+# threads; both hold the scheduler lock, which is what makes one shared
+# accumulator safe. update(dt) in the discrete mode calls update() again
+# for each tick; only the outermost call resets the accumulator and
+# observes, so one step is one sample. Phases only count inside update():
+# _animate_moving also runs lazily when moving_x is read to build a frame.
+_phase_time = [0.0]
+_depth = [0]  # update() calls in progress
+
+
+def _phase(key, fn):
+    h = histogram(key)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _depth[0]:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _phase_time[0] += elapsed
+            h.observe(elapsed)
+    return wrapper
+
+
+def _update(fn):
+    h = histogram('update_integrate')
+
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if _depth[0]:
+            return fn(self, *args, **kwargs)
+        _phase_time[0] = 0.0
+        _depth[0] += 1
+        start = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            _depth[0] -= 1
+            h.observe(time.perf_counter() - start - _phase_time[0])
+    return wrapper
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            histogram('json_encode').observe(time.perf_counter() - start)
+
+
+def instrument(game_state_cls, app):
+    """Installs the timed wrappers. Call once, and only when enabled."""
+    for method, key in UPDATE_PHASES.items():
+        setattr(game_state_cls, method, _phase(key, getattr(game_state_cls, method)))
+    game_state_cls.update = _update(game_state_cls.update)
+    game_state_cls.serialize = timed('serialize', game_state_cls.serialize)
+    app.json = TimedJSONProvider(app)
+
+
+# ── Exposition ───────────────────────────────────────────────────────────
+def rate(name, value):
+    """Per-second rate of a counter since the previous scrape (or since import)."""
+    now = time.monotonic()
+    last = _rates.get(name, (_started, 0))
+    _rates[name] = (now, value)
+    if now <= last[0]:
+        return 0.0
+    return (value - last[1]) / (now - last[0])
+
+
+def render(gauges):
+    """Prometheus text for every histogram plus `gauges` ({name: (help, value)})."""
+    lines = []
+    for name, (help_text, value) in gauges.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value:g}']
+    for key in sorted(histograms):
+        lines += histograms[key].render()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from fractions import Fraction
+
+from batch_engine import BatchEngine
+from wire import KEYS
+
+log = logging.getLogger(__name__)
+
+PLAYERS = ('p1', 'p2')
+CLOCK_SLACK = 30  # ticks a client clock may run ahead of real time (one second)
+
+
+def clean_inputs(inputs):
+    """Held keys per player as plain bools, or None if `inputs` is malformed.
+
+    Only p1/p2 with a dict of keys are accepted, so whatever a client posts
+    can never reach apply_input() in a shape that breaks the shared loop.
+    """
+    if inputs is None:
+        return {}
+    if not isinstance(inputs, dict):
+        return None
+    held = {}
+    for pid, keys in inputs.items():
+        if pid not in PLAYERS or not isinstance(keys, dict):
+            return None
+        held[pid] = {key: bool(keys.get(key)) for key in KEYS}
+    return held
+
+
+class TickScheduler:
+    """Advances every live session at a fixed rate from one background loop.
+
+    Inputs are not applied when they arrive. Clients write their held keys
+    into a latest-input buffer and every tick re-applies whatever is there,
+    so bursts or drops on the network can no longer speed up or stall the
+    physics. If the loop falls behind it runs up to `max_catch_up` extra
+    ticks to get back on schedule, and anything beyond that is dropped and
+    counted as an overrun.
+
+    With `batch=True` sessions are grouped by level and player count and
+    each group is stepped by one BatchEngine call (needs numpy).
+
+    Clients that predict locally number their ticks and send that number
+    as `seq` with each input. `acks[session_id]` is the client tick the
+    session's latest step corresponds to: the seq of the input it applied,
+    plus one for every tick since, because an unchanged input stands for
+    every client tick until the next one arrives.
+
+    Sessions in `client_clocked` are skipped by the loop. Their clients
+    send buffered per-tick inputs and step_batch() runs one update() for
+    each, which keeps movement deterministic over slow or lossy links.
+    Such a session still only advances as fast as real time: ticks more
+    than CLOCK_SLACK ahead of the time since it started are left for the
+    client to send again later, so a client cannot fast-forward the level
+    or make the server step it more than any other session.
+
+    `tick_rate` is how many game ticks pass per second. Above `rate`, every
+    step advances sessions by several ticks with update(dt), e.g. 30 ticks
+    at 15 steps a second is dt=2, and at 20 steps dt alternates 1 and 2.
+    This is meant for sessions with swept collisions (see GameState).
+
+    A session whose step raises is logged and set aside in `faulted`, so
+    one broken session never stops the loop for the others.
+    """
+
+    def __init__(self, socketio, sessions, rate=30, max_catch_up=5, on_tick=None, batch=False,
+                 tick_rate=None):
+        self.socketio     = socketio
+        self.sessions     = sessions      # session_id -> GameState, shared with app.py
+        self.rate         = rate
+        self.step         = 1.0 / rate
+        self.tick_rate    = tick_rate or rate
+        self.per_step     = Fraction(self.tick_rate, rate)  # ticks per step, at least 1
+        self.owed         = Fraction(0)                     # ticks not yet stepped
+        self.max_catch_up = max_catch_up
+        self.on_tick      = on_tick       # called with the ids stepped in each loop pass
+        self.inputs       = {}            # session_id -> latest held keys per player
+        self.new_seq      = {}            # session_id -> seq of an input not yet stepped
+        self.acks         = {}            # session_id -> client tick of the latest step
+        self.finished     = set()         # session_ids that have already won
+        self.client_clocked = set()       # session_ids stepped only by step_batch()
+        self.clock_start  = {}            # client-clocked session_id -> perf_counter() at its start
+        self.faulted      = set()         # session_ids whose step raised; no longer stepped
+        self.lock         = threading.Lock()
+        self.running      = False
+        self.batch        = batch
+        self.engines      = {}            # (template, num_players) -> BatchEngine
+
+        # Counters reported by stats()
+        self.ticks         = 0   # scheduler ticks run since start
+        self.session_steps = 0   # GameState.update() calls across all sessions
+        self.overruns      = 0   # loop passes that could not catch up
+        self.dropped_ticks = 0   # ticks skipped because of overruns
+        self.early_ticks   = 0   # client-clocked ticks refused for running ahead of real time
+        self.last_tick_ms  = 0.0
+        self.max_tick_ms   = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.socketio.start_background_task(self._run)
+
+    def stop(self):
+        self.running = False
+
+    def push_input(self, session_id, inputs, seq=None):
+        """Stores the latest held keys; applied on every following tick.
+
+        Returns False, and stores nothing, if the inputs are malformed.
+        """
+        inputs = clean_inputs(inputs)
+        if inputs is None:
+            return False
+        # Runs on request threads without the lock while the tick loop may be
+        # iterating the held keys, so swap in a merged copy instead of editing them
+        self.inputs[session_id] = {**self.inputs.get(session_id, {}), **inputs}
+        if isinstance(seq, int):
+            self.new_seq[session_id] = seq
+        return True
+
+    def clock_by_client(self, session_id):
+        """Leaves session_id to step_batch(); client ticks start at 1."""
+        self.client_clocked.add(session_id)
+        self.clock_start[session_id] = time.perf_counter()
+        self.acks[session_id] = 0
+
+    def forget(self, session_id):
+        self.inputs.pop(session_id, None)
+        self.new_seq.pop(session_id, None)
+        self.acks.pop(session_id, None)
+        self.client_clocked.discard(session_id)
+        self.clock_start.pop(session_id, None)
+        self.finished.discard(session_id)
+        self.faulted.discard(session_id)
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'tick_rate': self.tick_rate,
+            'batch': self.batch,
+            'ticks': self.ticks,
+            'session_steps': self.session_steps,
+            'overruns': self.overruns,
+            'dropped_ticks': self.dropped_ticks,
+            'early_ticks': self.early_ticks,
+            'faulted': len(self.faulted),
+            'last_tick_ms': round(self.last_tick_ms, 3),
+            'max_tick_ms': round(self.max_tick_ms, 3),
+        }
+
+    def _run(self):
+        last = time.perf_counter()
+        behind = 0.0  # accumulated real time not yet simulated
+        while self.running:
+            now = time.perf_counter()
+            behind += now - last
+            last = now
+
+            stepped = set()
+            steps = 0
+            while behind >= self.step and steps <= self.max_catch_up:
+                stepped |= self.tick_all()
+                behind -= self.step
+                steps += 1
+            if behind >= self.step:
+                # Too far behind to catch up: drop the backlog instead of spiralling
+                self.overruns += 1
+                self.dropped_ticks += int(behind // self.step)
+                behind %= self.step
+
+            if stepped and self.on_tick:
+                try:
+                    self.on_tick(stepped)
+                except Exception:
+                    log.exception('publishing frames failed')
+            self.socketio.sleep(max(0.0, self.step - behind))
+
+    def tick_all(self):
+        """Runs one fixed step for every live session. Returns the ids stepped."""
+        start = time.perf_counter()
+        self.owed += self.per_step
+        dt = int(self.owed)
+        self.owed -= dt
+        with self.lock:
+            skip = self.finished | self.client_clocked | self.faulted
+            live = [(session_id, state) for session_id, state in self.sessions.items()
+                    if session_id not in skip]
+            if self.batch:
+                self._step_batched(live, dt)
+            else:
+                for session_id, state in live:
+                    self._step_one(session_id, state, dt)
+            live = [(session_id, state) for session_id, state in live if session_id not in self.faulted]
+            self._advance_acks(live, dt)
+        self.ticks += 1
+        self.session_steps += len(live)
+        self.last_tick_ms = (time.perf_counter() - start) * 1000
+        self.max_tick_ms = max(self.max_tick_ms, self.last_tick_ms)
+        return {session_id for session_id, _ in live}
+
+    def _step_one(self, session_id, state, dt=1):
+        try:
+            state.update(dt, self.inputs.get(session_id))  # held keys count on every tick of the step
+            if state.check_win():
+                self.finished.add(session_id)
+        except Exception:
+            log.exception('session %s failed to step and is no longer stepped', session_id)
+            self.faulted.add(session_id)
+
+    def step_batch(self, session_id, first_seq, batch):
+        """Runs one update() per entry of `batch` (per-tick inputs from first_seq on).
+
+        Entries at or below the session's ack were applied by an earlier
+        request whose reply got lost, and are skipped. Entries ahead of real
+        time (see CLOCK_SLACK) are not applied or acknowledged yet. Stepping
+        stops at a win, so a win in the middle of a batch is kept. Returns
+        the number of updates run.
+        """
+        steps = 0
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None:
+                return 0
+            ack = self.acks.get(session_id, -1)
+            start = self.clock_start.get(session_id)
+            limit = None
+            if start is not None:
+                limit = int((time.perf_counter() - start) * self.tick_rate) + CLOCK_SLACK
+            for seq, inputs in enumerate(batch, first_seq):
+                if session_id in self.finished:
+                    break
+                if seq <= ack:
+                    continue
+                if limit is not None and seq > limit:
+                    self.early_ticks += first_seq + len(batch) - seq
+                    break
+                held = self.inputs.setdefault(session_id, {})
+                held.update(inputs or {})
+                for pid, inp in held.items():
+                    state.apply_input(pid, inp)
+                state.update()
+                self.acks[session_id] = seq
+                steps += 1
+                if state.check_win():
+                    self.finished.add(session_id)
+        self.session_steps += steps
+        return steps
+
+    def _advance_acks(self, live, dt=1):
+        new_seq, acks = self.new_seq, self.acks
+        for session_id, _ in live:
+            seq = new_seq.pop(session_id, None)
+            if seq is not None:
+                acks[session_id] = seq + dt - 1
+            elif session_id in acks:
+                acks[session_id] += dt
+
+    def _step_batched(self, live, dt=1):
+        groups = {}
+        for session_id, state in live:
+            groups.setdefault((state.template, state.num_players), []).append((session_id, state))
+        for key, members in groups.items():
+            engine = self.engines.get(key)
+            if engine is None:
+                engine = self.engines[key] = BatchEngine(*key)
+            states = [state for _, state in members]
+            try:
+                engine.load(states)
+                held = [self.inputs.get(session_id, {}) for session_id, _ in members]
+                for _ in range(dt):
+                    engine.apply_inputs(held)  # again every tick, as update() does
+                    engine.step()
+                wins = engine.wins().tolist()
+                engine.store(states)
+            except Exception:
+                # Step the group one by one, so only a session that fails alone is set aside
+                log.exception('batched step of %d sessions failed', len(members))
+                for session_id, state in members:
+                    self._step_one(session_id, state, dt)
+                continue
+            for (session_id, _), won in zip(members, wins):
+                if won:
+                    self.finished.add(session_id)
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    """session_id -> GameState, with idle-TTL and LRU capacity eviction.
+
+    Sessions are kept in least-recently-used order. touch() marks activity
+    (inputs, joins); a background sweeper ends sessions idle for longer than
+    `ttl` seconds, and adding a session beyond `max_sessions` ends the least
+    recently used one. Every removal goes through end(), which calls
+    `on_end(session_id, reason)` so the app can drop per-session bookkeeping.
+    """
+
+    def __init__(self, ttl=600, max_sessions=5000, on_end=None):
+        self.ttl          = ttl
+        self.max_sessions = max_sessions
+        self.on_end       = on_end
+        self._sessions    = OrderedDict()  # session_id -> GameState, LRU first
+        self._last_seen   = {}             # session_id -> time.monotonic() of last activity
+        self.lock         = threading.RLock()
+        self.sweeping     = False
+
+        # Counters reported by stats()
+        self.created      = 0
+        self.ended        = 0   # explicit end_game / end_session
+        self.evicted_idle = 0   # removed by the TTL sweeper
+        self.evicted_lru  = 0   # removed to stay under max_sessions
+        self.peak         = 0
+
+    # ── Mapping interface used by the app and the scheduler ──────────────
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def __getitem__(self, session_id):
+        return self._sessions[session_id]
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id, default=None):
+        return self._sessions.get(session_id, default)
+
+    def items(self):
+        """Snapshot of (session_id, state) pairs, safe to iterate while sessions come and go."""
+        with self.lock:
+            return list(self._sessions.items())
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+    def add(self, session_id, state):
+        with self.lock:
+            while len(self._sessions) >= self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self.end(oldest, 'capacity')
+            self._sessions[session_id] = state
+            self._last_seen[session_id] = time.monotonic()
+            self.created += 1
+            self.peak = max(self.peak, len(self._sessions))
+
+    def touch(self, session_id):
+        """Records activity; returns False if the session no longer exists."""
+        with self.lock:
+            if session_id not in self._sessions:
+                return False
+            self._sessions.move_to_end(session_id)
+            self._last_seen[session_id] = time.monotonic()
+            return True
+
+    def end(self, session_id, reason='ended'):
+        """Removes a session. Returns False if it was already gone."""
+        with self.lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            self._last_seen.pop(session_id, None)
+            if reason == 'idle':
+                self.evicted_idle += 1
+            elif reason == 'capacity':
+                self.evicted_lru += 1
+            else:
+                self.ended += 1
+        if self.on_end:
+            self.on_end(session_id, reason)
+        return True
+
+    def sweep(self):
+        """Ends every session idle for longer than the TTL. Returns how many."""
+        cutoff = time.monotonic() - self.ttl
+        with self.lock:
+            # LRU order means idle sessions are all at the front
+            idle = []
+            for session_id in self._sessions:
+                if self._last_seen[session_id] > cutoff:
+                    break
+                idle.append(session_id)
+        for session_id in idle:
+            self.end(session_id, 'idle')
+        return len(idle)
+
+    def start_sweeper(self, socketio, interval=30):
+        if self.sweeping:
+            return
+        self.sweeping = True
+        socketio.start_background_task(self._sweep_loop, socketio, interval)
+
+    def _sweep_loop(self, socketio, interval):
+        while self.sweeping:
+            socketio.sleep(interval)
+            self.sweep()
+
+    def stats(self):
+        return {
+            'live': len(self._sessions),
+            'peak': self.peak,
+            'created': self.created,
+            'ended': self.ended,
+            'evicted_idle': self.evicted_idle,
+            'evicted_lru': self.evicted_lru,
+            'ttl': self.ttl,
+            'max_sessions': self.max_sessions,
+        }
@@ -0,0 +1,298 @@
+"""Runs the game as several worker processes behind a session-affinity router.
+
+    python shards.py --workers 4 --port 8080
+
+Every worker is a normal app.py process on its own local port, with its own
+sessions and tick loop. Workers get SHARD and SHARDS in their environment
+and only hand out session IDs that owner() maps back to themselves, so any
+request naming a session can be routed without a lookup table:
+
+    /api/start_game       next worker in turn; the new session lives there
+    /api/input, /api/input_batch, /api/end_game
+                          owner of the session_id in the body
+    /socket.io/           owner of the session_id (players) or spectate token
+                          (spectators) query parameter, which the client sends
+                          when connecting; websockets are piped as is
+    /api/stats            every worker, with the counters summed
+    /metrics              every worker, each sample labelled with its shard
+    anything else         next worker in turn (pages and static files)
+
+Session IDs are still 8 characters, so single-process servers and clients
+need no changes.
+
+The router is one Python process, so with many clients it becomes the
+bottleneck: every input and every websocket byte passes through it. With
+--direct the workers listen on --host as well, /api/start_game tells the
+browser its worker's port, and the browser then sends that session's
+inputs and socket straight to the worker. The router is left with pages,
+new games, stats and spectators. Clients that ignore the port still work
+through the router.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import wire
+
+SESSION_ROUTES = ('/api/input', '/api/input_batch', '/api/end_game')
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade',
+               'proxy-authenticate', 'proxy-authorization', 'te', 'trailers'}
+STARTUP_TIMEOUT = 30  # seconds to wait for a worker to accept connections
+
+
+def owner(session_id, shards):
+    """Index of the shard that holds session_id. Stable across processes and runs."""
+    return zlib.crc32(session_id.encode('ascii', 'replace')) % shards
+
+
+def body_session_id(body, content_type):
+    """session_id from a JSON or binary (wire.py) request body, or None."""
+    if content_type.split(';')[0].strip() == wire.CONTENT_TYPE:
+        return body[:8].decode('ascii', 'replace').rstrip('\0') if len(body) >= 8 else None
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        return None
+    session_id = data.get('session_id') if isinstance(data, dict) else None
+    return session_id if isinstance(session_id, str) else None
+
+
+# ── Stats ────────────────────────────────────────────────────────────────
+def merge_stats(shard_stats):
+    """Sums the /api/stats of every shard; limits and *_ms timings take the maximum."""
+    def merge(key, values):
+        if all(isinstance(v, dict) for v in values):
+            return {k: merge(k, [v[k] for v in values if k in v]) for k in values[0]}
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            if key.startswith('max') or key.endswith('_ms') or key in ('rate', 'tick_rate', 'ttl'):
+                return max(values)
+            return round(sum(values), 3)
+        return values[0]
+    merged = merge('', shard_stats) if shard_stats else {}
+    merged['shards'] = shard_stats
+    return merged
+
+
+def merge_metrics(texts):
+    """One Prometheus text from every shard's, samples labelled shard="<i>"."""
+    families = {}  # metric name -> [HELP/TYPE lines, samples...], in first-seen order
+    for shard, text in enumerate(texts):
+        name = None
+        for line in text.splitlines():
+            if line.startswith('# HELP '):
+                name = line.split()[2]
+                if name in families:
+                    continue
+                families[name] = [line]
+            elif line.startswith('# TYPE '):
+                if len(families[name]) == 1:
+                    families[name].append(line)
+            elif line and name:
+                metric, _, value = line.rpartition(' ')
+                base, brace, labels = metric.partition('{')
+                labels = f'shard="{shard}",' + labels if brace else f'shard="{shard}"}}'
+                families[name].append(f'{base}{{{labels} {value}')
+    return '\n'.join(line for lines in families.values() for line in lines) + '\n'
+
+
+# ── Router ───────────────────────────────────────────────────────────────
+class Router(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, ports, worker_host='127.0.0.1'):
+        super().__init__(address, RouterHandler)
+        self.ports = ports
+        self.worker_host = worker_host
+        self.turn = itertools.count()
+        self.local = threading.local()  # per-thread keep-alive connections to the workers
+
+    def next_shard(self):
+        return next(self.turn) % len(self.ports)
+
+    def connection(self, shard, fresh=False):
+        conns = self.local.__dict__.setdefault('conns', {})
+        if fresh or shard not in conns:
+            if shard in conns:
+                conns[shard].close()
+            conns[shard] = http.client.HTTPConnection(self.worker_host, self.ports[shard], timeout=60)
+        return conns[shard]
+
+    def fetch(self, shard, method, path, body=None, headers=None):
+        """(status, headers, body) of one request to a worker; retried once on a stale connection."""
+        for fresh in (False, True):
+            conn = self.connection(shard, fresh)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+                return resp.status, resp.getheaders(), resp.read()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                if fresh:
+                    raise
+
+
+class RouterHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, *args):
+        pass  # one line per input request would drown everything else
+
+    def do_GET(self):
+        self._route()
+
+    def do_POST(self):
+        self._route()
+
+    def _route(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if url.path in ('/api/stats', '/metrics'):
+            return self._gather(url.path)
+
+        session_id = None
+        if url.path in SESSION_ROUTES:
+            session_id = body_session_id(body, self.headers.get('Content-Type', ''))
+        elif url.path.startswith('/socket.io/'):
+            query = parse_qs(url.query)
+            session_id = (query.get('session_id') or query.get('spectate') or [None])[0]
+        shards = len(self.server.ports)
+        shard = owner(session_id, shards) if session_id else self.server.next_shard()
+
+        if self.headers.get('Upgrade', '').lower() == 'websocket':
+            return self._pipe(shard)
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+        try:
+            status, resp_headers, resp_body = self.server.fetch(shard, self.command, self.path, body, headers)
+        except OSError:
+            return self._reply(502, [('Content-Type', 'text/plain')], b'shard unavailable\n')
+        self._reply(status, resp_headers, resp_body)
+
+    def _gather(self, path):
+        """Asks every worker and answers with the merged result."""
+        try:
+            replies = [self.server.fetch(shard, 'GET', path) for shard in range(len(self.server.ports))]
+        except OSError:
+            return self._reply(502, [('Content-Type', 'text/plain')], b'shard unavailable\n')
+        for status, headers, body in replies:
+            if status != 200:  # e.g. /metrics while METRICS is off
+                return self._reply(status, headers, body)
+        bodies = [body for _, _, body in replies]
+        if path == '/metrics':
+            return self._reply(200, [('Content-Type', 'text/plain; version=0.0.4')],
+                               merge_metrics([b.decode() for b in bodies]).encode())
+        return self._reply(200, [('Content-Type', 'application/json')],
+                           json.dumps(merge_stats([json.loads(b) for b in bodies])).encode())
+
+    def _reply(self, status, headers, body):
+        self.send_response(status)
+        for k, v in headers:
+            if k.lower() not in HOP_HEADERS and k.lower() != 'content-length':
+                self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _pipe(self, shard):
+        """Hands a websocket upgrade to the worker and copies bytes both ways until either side closes."""
+        try:
+            upstream = socket.create_connection((self.server.worker_host, self.server.ports[shard]))
+        except OSError:
+            return self._reply(502, [('Content-Type', 'text/plain')], b'shard unavailable\n')
+        for sock in (upstream, self.connection):  # small frames go out at once, as the worker sends them
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        head = f'{self.requestline}\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in self.headers.items())
+        upstream.sendall(head.encode('latin-1') + b'\r\n')
+
+        def downstream():
+            try:
+                while data := upstream.recv(65536):
+                    self.connection.sendall(data)
+            except OSError:
+                pass
+            finally:
+                self.connection.close()
+        threading.Thread(target=downstream, daemon=True).start()
+        try:
+            while data := self.rfile.read1(65536):
+                upstream.sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+            self.close_connection = True
+
+
+# ── Workers ──────────────────────────────────────────────────────────────
+def start_workers(count, base_port, host='127.0.0.1', direct=False):
+    here = os.path.dirname(os.path.abspath(__file__))
+    workers = []
+    for shard in range(count):
+        env = dict(os.environ, SHARD=str(shard), SHARDS=str(count),
+                   HOST=host, PORT=str(base_port + shard), DIRECT='1' if direct else '0')
+        workers.append(subprocess.Popen([sys.executable, os.path.join(here, 'app.py')], env=env, cwd=here))
+    return workers
+
+
+def wait_for(host, port, worker):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if worker.poll() is not None:
+            raise RuntimeError(f'worker on port {port} exited with {worker.returncode}')
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'worker on port {port} did not start in {STARTUP_TIMEOUT}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the game server as several worker processes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080, help='port the router listens on')
+    parser.add_argument('--worker-port', type=int, default=9100,
+                        help='first local port for workers; worker i uses this + i')
+    parser.add_argument('--direct', action='store_true',
+                        help='workers listen on --host too and browsers send game traffic straight to them')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    ports = [args.worker_port + i for i in range(args.workers)]
+    bind = args.host if args.direct else '127.0.0.1'
+    reach = '127.0.0.1' if bind in ('0.0.0.0', '') else bind  # where the router finds the workers
+    workers = start_workers(args.workers, args.worker_port, bind, args.direct)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for port, worker in zip(ports, workers):
+            wait_for(reach, port, worker)
+        router = Router((args.host, args.port), ports, reach)
+        print(f'routing :{args.port} to {args.workers} workers on ports {ports[0]}-{ports[-1]}'
+              + (', game traffic direct to the workers' if args.direct else ''), flush=True)
+        router.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
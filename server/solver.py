@@ -0,0 +1,327 @@
+"""Checks that every level can be beaten, using the real GameState physics.
+
+Greedy best-first search over macro-actions: each action holds one key
+combination per player for MACRO_TICKS ticks. States are deduplicated on a
+discretized key (player cells, vertical speed, trigger flags and the phase
+of each moving tile), and each node keeps a GameState.snapshot() so a
+child costs one restore() plus MACRO_TICKS updates. Levels are solved one
+stage at a time (door plates, goal plates, then the goal), with the
+heuristic measuring distance to the current stage's targets.
+
+    python solver.py                 # every level, exit 1 if one is unsolved
+    python solver.py duo_3 --json    # one level, machine-readable report
+    python solver.py --collision swept --dt 2   # as a server with STEP_HZ=15
+
+With --dt the search steps the game the way the tick loop does then: inputs
+can only change every dt ticks, and each step is one update(dt, inputs).
+Every solution found is replayed on a fresh GameState, stepped the same
+way, before it is reported.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import math
+import sys
+import time
+
+import levels
+from game_state import COLLISIONS, GameState, PLAYER_H, PLAYER_W
+
+MACRO_TICKS = 4
+CELL = 4                 # px per position bucket in the dedupe key
+PHASE_BUCKETS = 24       # buckets per oscillation of a moving tile
+PHASE_COST = 2000        # heuristic cost of each objective still ahead
+TICK_COST = 0.5          # prefers shorter solutions among equally close states
+DEFAULT_BUDGET = 200000  # nodes expanded before giving up on a level
+
+# left, right, jump
+ACTIONS = (
+    {'left': False, 'right': False, 'jump': False},
+    {'left': True, 'right': False, 'jump': False},
+    {'left': False, 'right': True, 'jump': False},
+    {'left': False, 'right': False, 'jump': True},
+    {'left': True, 'right': False, 'jump': True},
+    {'left': False, 'right': True, 'jump': True},
+)
+
+
+class SearchState(GameState):
+    """GameState that remembers whether anyone fell, so the branch can be pruned."""
+
+    def respawn_all(self):
+        self.died = True
+        super().respawn_all()
+
+
+def _center(rect, x=None):
+    rx, ry, rw, _ = rect[:4]
+    return (rx if x is None else x) + rw / 2, ry
+
+
+class Solver:
+    def __init__(self, num_players, level, budget=DEFAULT_BUDGET, collision='discrete', dt=1):
+        self.state = SearchState('solver', num_players, level, collision)
+        self.state.died = False
+        self.template = self.state.template
+        self.budget = budget
+        self.dt = dt
+        self.pids = list(self.state.players)
+        self.joint = [dict(zip(self.pids, combo))
+                      for combo in itertools.product(ACTIONS, repeat=len(self.pids))]
+        self.explored = 0
+
+    def solve(self):
+        """Returns a list of per-tick input dicts that wins, or None.
+
+        Solved one stage (a change of trigger flags) at a time. Inside a
+        stage, players with a target of their own are first planned one
+        after the other while the rest stand still, which keeps the search
+        linear in the number of players. If that does not finish the stage
+        (say a player slides off a moving plate while waiting), the stage
+        is searched again with every combination of both players' keys.
+        """
+        state = self.state
+        plan = []
+        while not state.check_win():
+            start = state.snapshot()
+            segment = self._solve_players_in_turn()
+            if segment is None:
+                state.restore(start)
+                segment = self._search(self.joint, self._stage_done(), self._heuristic)
+            if segment is None:
+                return None
+            plan += segment
+        return plan
+
+    # ── Stages ───────────────────────────────────────────────────────────
+    def _flags(self):
+        return tuple(self.state.triggered), self.state.goal_locked
+
+    def _stage_done(self):
+        flags = self._flags()
+        return lambda: self._flags() != flags or self.state.check_win()
+
+    def _stage_plates(self):
+        """Untriggered plates of the current stage: door plates first, then goal plates."""
+        state, template = self.state, self.template
+        triggered = state.triggered
+        plate_ids = [i for i in template.door_plates if not triggered[i]]
+        if not plate_ids and state.goal_locked:
+            plate_ids = [i for i in template.goal_plates if not triggered[i]]
+            if template.goal_plate is not None and not triggered[template.goal_plate]:
+                plate_ids.append(template.goal_plate)
+        return plate_ids
+
+    def _targets(self):
+        """pid -> predicate for the players that each have their own target this stage.
+
+        None when the stage has a target any player can take (solo plates).
+        """
+        state, template = self.state, self.template
+        plate_ids = self._stage_plates()
+        if not plate_ids:
+            gx, gy, gw, gh = template.goal
+            def in_goal(p):
+                return (gx <= p.x + PLAYER_W / 2 <= gx + gw and
+                        gy <= p.y + PLAYER_H / 2 <= gy + gh)
+            return {pid: in_goal for pid in self.pids}
+        targets = {}
+        for i in plate_ids:
+            owner = template.plates[i][6]
+            if owner not in state.players or owner in targets:
+                return None
+            targets[owner] = lambda p, i=i: state._player_on_plate(p, i)
+        return targets
+
+    def _solve_players_in_turn(self):
+        targets = self._targets()
+        if targets is None or len(self.pids) == 1:
+            return None
+        state = self.state
+        stage_done = self._stage_done()
+        idle = ACTIONS[0]
+        plan = []
+        for pid in self.pids:
+            if pid not in targets:
+                continue
+            player, reached = state.players[pid], targets[pid]
+            actions = [{**{other: idle for other in self.pids}, pid: a} for a in ACTIONS]
+            segment = self._search(actions, lambda: reached(player) or stage_done(),
+                                   lambda: self._player_heuristic(pid))
+            if segment is None:
+                return None
+            plan += segment
+            if stage_done():
+                return plan
+        # Everyone is on their target; the flags flip on the next update
+        wait = {pid: idle for pid in self.pids}
+        state.died = False
+        ticks = self._step(wait, stage_done)
+        if state.died or not stage_done():
+            return None
+        return plan + [wait] * ticks
+
+    # ── Search ───────────────────────────────────────────────────────────
+    def _search(self, actions, done, heuristic):
+        """Best-first search from the current state until done() holds.
+
+        Returns the per-tick inputs, cut at the tick done() first held, and
+        leaves the state there; None if the budget runs out first.
+        """
+        state = self.state
+        root = state.snapshot()
+        seen = {self._key()}
+        order = itertools.count()
+        frontier = [(heuristic(), next(order), root)]
+        parents = {}  # node id -> (parent id, action index, ticks stepped)
+        while frontier and self.explored < self.budget:
+            _, node, snap = heapq.heappop(frontier)
+            self.explored += 1
+            for a, inputs in enumerate(actions):
+                state.restore(snap)
+                state.died = False
+                ticks = self._step(inputs, done)
+                if state.died:
+                    continue
+                child = next(order)
+                parents[child] = (node, a, ticks)
+                if ticks < MACRO_TICKS or done():
+                    return self._path(parents, child, actions)
+                key = self._key()
+                if key in seen:
+                    continue
+                seen.add(key)
+                priority = heuristic() + TICK_COST * state.tick
+                heapq.heappush(frontier, (priority, child, state.snapshot()))
+        return None
+
+    def _step(self, inputs, done):
+        """Holds inputs for MACRO_TICKS ticks or more, dt at a time. Returns the ticks run."""
+        state, dt = self.state, self.dt
+        ticks = 0
+        while ticks < MACRO_TICKS:
+            state.update(dt, inputs)
+            ticks += dt
+            if done():
+                break
+        return ticks
+
+    def _path(self, parents, node, actions):
+        segment = []
+        while node in parents:
+            node, a, ticks = parents[node]
+            segment.append([actions[a]] * ticks)
+        return [inputs for macro in reversed(segment) for inputs in macro]
+
+    # ── Search helpers ───────────────────────────────────────────────────
+    def _key(self):
+        state = self.state
+        key = [tuple(state.triggered), state.goal_locked]
+        for p in state.players.values():
+            key += (int(p.x // CELL), int(p.y // CELL), round(p.vy), p.on_ground)
+        for _, _, speed in self.template.moving:
+            phase = (state.tick * speed) % (2 * math.pi)
+            key.append(int(phase / (2 * math.pi) * PHASE_BUCKETS))
+        return tuple(key)
+
+    def _heuristic(self):
+        """Stages left times PHASE_COST plus the distance to the current targets."""
+        state = self.state
+        plate_ids = self._stage_plates()
+        if plate_ids:
+            stages = 2 if any(not state.triggered[i] for i in self.template.door_plates) else 1
+            return stages * PHASE_COST + self._to_plates(plate_ids)
+        return sum(self._to_goal(p) for p in state.players.values())
+
+    def _player_heuristic(self, pid):
+        """Distance from one player to its own target this stage."""
+        for i in self._stage_plates():
+            if self.template.plates[i][6] == pid:
+                return self._to_plates([i])
+        return self._to_goal(self.state.players[pid])
+
+    def _to_plates(self, plate_ids):
+        """Players with an assigned plate head to it; otherwise the nearest player goes."""
+        state, plates = self.state, self.template.plates
+        total = 0.0
+        for i in plate_ids:
+            x, y, w, h, mi, _, owner = plates[i]
+            cx, cy = _center(plates[i], state.moving_x[mi] if mi >= 0 else None)
+            if owner in state.players:
+                total += self._distance(state.players[owner], cx, cy - PLAYER_H / 2)
+            else:
+                total += min(self._distance(p, cx, cy - PLAYER_H / 2) for p in state.players.values())
+        return total
+
+    def _to_goal(self, p):
+        gx, gy, gw, gh = self.template.goal
+        return self._distance(p, gx + gw / 2, gy + gh / 2)
+
+    @staticmethod
+    def _distance(p, x, y):
+        return abs(p.x + PLAYER_W / 2 - x) + abs(p.y + PLAYER_H / 2 - y)
+
+
+def replay(num_players, level, inputs, collision='discrete', dt=1):
+    """Steps a fresh GameState through inputs, dt ticks per update().
+
+    Each step holds the inputs of its first tick, as the tick loop holds
+    the last keys it was sent. Returns the tick it wins at, or None.
+    """
+    state = GameState('replay', num_players, level, collision)
+    for tick in range(0, len(inputs), dt):
+        state.update(dt, inputs[tick])
+        if state.check_win():
+            return state.tick
+    return None
+
+
+def solve_level(mode, number, budget=DEFAULT_BUDGET, collision='discrete', dt=1):
+    num_players = 2 if mode == 'duo' else 1
+    solver = Solver(num_players, number, budget, collision, dt)
+    start = time.perf_counter()
+    inputs = solver.solve()
+    elapsed = time.perf_counter() - start
+    won_at = replay(num_players, number, inputs, collision, dt) if inputs else None
+    return {
+        'level': f'{mode}_{number}',
+        'solved': won_at is not None,
+        'ticks': won_at,
+        'explored': solver.explored,
+        'seconds': round(elapsed, 3),
+        'inputs': inputs[:won_at] if won_at else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that levels can be beaten')
+    parser.add_argument('levels', nargs='*', help='e.g. solo_1 duo_3 (default: every level)')
+    parser.add_argument('--budget', type=int, default=DEFAULT_BUDGET,
+                        help='nodes to expand per level before giving up')
+    parser.add_argument('--collision', choices=COLLISIONS, default='discrete')
+    parser.add_argument('--dt', type=int, default=1,
+                        help='ticks per update, as the server steps with STEP_HZ=30/dt')
+    parser.add_argument('--json', action='store_true', help='print the report, with solutions, as JSON')
+    args = parser.parse_args(argv)
+    if args.dt < 1:
+        parser.error('--dt must be at least 1')
+
+    names = args.levels or [f'{mode}_{n}' for mode in ('solo', 'duo') for n in levels.available(mode)]
+    reports = []
+    for name in names:
+        mode, _, number = name.partition('_')
+        if mode not in ('solo', 'duo') or not number.isdigit() or int(number) not in levels.available(mode):
+            parser.error(f'no level {name!r}, expected solo_<n> or duo_<n> with a file in levels/')
+        report = solve_level(mode, int(number), args.budget, args.collision, args.dt)
+        reports.append(report)
+        if not args.json:
+            status = f"solved in {report['ticks']} ticks" if report['solved'] else 'NOT SOLVED'
+            print(f"{report['level']:<8} {status:<22} {report['explored']:>8} states  {report['seconds']:>7.2f}s")
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    return 0 if all(r['solved'] for r in reports) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
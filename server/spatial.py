@@ -0,0 +1,42 @@
+class SpatialGrid:
+    """Uniform-grid broad phase over an ordered list of axis-aligned boxes.
+
+    Boxes are bucketed by the cells they cover and queries return their
+    indices in insertion order, so callers that depend on resolution order
+    (see GameState._resolve_x / _resolve_y) see the same sequence they would
+    get by scanning the full list, minus the boxes that cannot overlap.
+    """
+
+    def __init__(self, cell=64):
+        self.cell = cell
+        self.cells = {}  # (cx, cy) -> tuple of box indices, ascending
+        self._merged = {}  # span -> merged indices of a multi-cell block
+
+    def span(self, x0, y0, x1, y1):
+        """The (cx0, cy0, cx1, cy1) block of cells a rectangle touches."""
+        c = self.cell
+        return int(x0 // c), int(y0 // c), int(x1 // c), int(y1 // c)
+
+    def build(self, boxes):
+        """Buckets (index, x0, y0, x1, y1) boxes. Indices must be ascending."""
+        cells = {}
+        for idx, x0, y0, x1, y1 in boxes:
+            cx0, cy0, cx1, cy1 = self.span(x0, y0, x1, y1)
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cells.setdefault((cx, cy), []).append(idx)
+        self.cells = {key: tuple(ids) for key, ids in cells.items()}
+        self._merged = {}
+
+    def query(self, span):
+        """Indices of every box in the given block of cells, ascending."""
+        merged = self._merged.get(span)
+        if merged is not None:
+            return merged
+        cx0, cy0, cx1, cy1 = span
+        found = set()
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                found.update(self.cells.get((cx, cy), ()))
+        merged = self._merged[span] = tuple(sorted(found))
+        return merged
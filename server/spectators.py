@@ -0,0 +1,170 @@
+"""Read-only viewers of a session, fed from one encoded frame per tick.
+
+A session's ID is what its players send inputs and end the game with, so
+it is never handed to watchers. Each session gets a separate spectate
+token instead (allow()), which only the `spectate` socket event accepts.
+A spectator subscribes with that token and from then on receives
+wire.encode_frame() bytes. app.py encodes a session's
+frame once per tick, and only when some spectator is due one, and the same
+bytes object goes to every spectator of that session, so each extra viewer
+costs one socket write and no serialisation. The writes happen on a
+sender task of their own, never on the tick loop.
+
+Spectators never touch the session: they do not step it, send inputs or
+keep it alive, so the game runs at the same speed with or without them.
+
+Each viewer asks for a rate (`hz`, at most the tick rate) and is sent a frame
+only every rate // hz ticks. A viewer has at most IN_FLIGHT frames sent and
+not yet acknowledged by its client; beyond that, newer frames replace a
+single pending slot instead of queueing, so a slow viewer skips stale
+frames rather than falling behind or holding memory. Binary frames are
+absolute, so a viewer that skips some still renders the latest state.
+"""
+import threading
+
+IN_FLIGHT = 2  # unacknowledged frames per viewer; two cover one ack round trip at 30 Hz
+
+
+class Viewer:
+    __slots__ = ('sid', 'session_id', 'every', 'next_tick', 'in_flight', 'pending')
+
+    def __init__(self, sid, session_id, every):
+        self.sid        = sid
+        self.session_id = session_id
+        self.every      = every  # ticks between frames
+        self.next_tick  = 0      # first tick this viewer is due a frame again
+        self.in_flight  = 0      # frames sent and not yet acknowledged
+        self.pending    = None   # newest frame held back while IN_FLIGHT are out
+
+
+class Spectators:
+    """session_id -> viewers, and the fan-out of each session's frames to them."""
+
+    def __init__(self, send, rate=30):
+        self.send    = send   # send(sid, frame, on_ack) pushes one frame to one viewer
+        self.rate    = rate   # ticks per second of the sessions being watched
+        self.viewers = {}     # session_id -> {sid: Viewer}
+        self.by_sid  = {}     # sid -> Viewer
+        self.tokens  = {}     # spectate token -> session_id
+        self.token_of = {}    # session_id -> its spectate token
+        self.lock    = threading.Lock()
+        self.outbox  = []     # (sid, frame) waiting for the sender task
+        self.ready   = threading.Event()
+        self.sending = False
+
+        # Counters reported by stats()
+        self.encoded = 0   # frames encoded for spectators
+        self.sent    = 0   # frames written to a viewer
+        self.dropped = 0   # frames replaced while a viewer was still busy
+
+    def start(self, start_task):
+        """Starts the sender task with e.g. socketio.start_background_task."""
+        if self.sending:
+            return
+        self.sending = True
+        start_task(self._send_loop)
+
+    def _send_loop(self):
+        while self.sending:
+            self.ready.wait()
+            with self.lock:
+                batch, self.outbox = self.outbox, []
+                self.ready.clear()
+            for sid, frame in batch:
+                self.send(sid, frame, lambda *_, sid=sid: self._acked(sid))
+
+    def __contains__(self, session_id):
+        return session_id in self.viewers
+
+    def allow(self, session_id, token):
+        """Lets `token` watch session_id, and nothing else."""
+        with self.lock:
+            self.tokens[token] = session_id
+            self.token_of[session_id] = token
+
+    def session_for(self, token):
+        """session_id a spectate token watches, or None."""
+        return self.tokens.get(token) if isinstance(token, str) else None
+
+    def subscribe(self, session_id, sid, hz=None):
+        """Starts feeding `sid` frames of session_id at up to `hz` per second."""
+        if not isinstance(hz, (int, float)) or hz <= 0 or hz > self.rate:
+            hz = self.rate
+        viewer = Viewer(sid, session_id, max(1, round(self.rate / hz)))
+        with self.lock:
+            self._remove(sid)
+            self.viewers.setdefault(session_id, {})[sid] = viewer
+            self.by_sid[sid] = viewer
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            self._remove(sid)
+
+    def _remove(self, sid):
+        viewer = self.by_sid.pop(sid, None)
+        if viewer is None:
+            return
+        room = self.viewers[viewer.session_id]
+        del room[sid]
+        if not room:
+            del self.viewers[viewer.session_id]
+
+    def end(self, session_id):
+        """Drops every viewer and the token of a session that ended. Returns their sids."""
+        with self.lock:
+            self.tokens.pop(self.token_of.pop(session_id, None), None)
+            room = self.viewers.pop(session_id, {})
+            for sid in room:
+                del self.by_sid[sid]
+        return list(room)
+
+    def due(self, session_id, tick):
+        """True if any viewer of session_id should get the frame of `tick`."""
+        room = self.viewers.get(session_id)
+        return bool(room) and any(v.next_tick <= tick for v in list(room.values()))
+
+    def publish(self, session_id, tick, frame):
+        """Hands one encoded frame to every viewer of session_id that is due it."""
+        with self.lock:
+            self.encoded += 1
+            for viewer in self.viewers.get(session_id, {}).values():
+                if viewer.next_tick > tick:
+                    continue
+                # Counted from when it was due, so steps of several ticks keep the
+                # average rate; a viewer that was far behind starts over from now
+                due = viewer.next_tick + viewer.every
+                viewer.next_tick = due if due > tick else tick + viewer.every
+                if viewer.in_flight >= IN_FLIGHT:
+                    if viewer.pending is not None:
+                        self.dropped += 1
+                    viewer.pending = frame
+                else:
+                    viewer.in_flight += 1
+                    self._queue(viewer.sid, frame)
+
+    def _queue(self, sid, frame):
+        # Caller holds the lock
+        self.outbox.append((sid, frame))
+        self.sent += 1
+        self.ready.set()
+
+    def _acked(self, sid):
+        """The viewer's client has a frame: send the one held back, if any."""
+        with self.lock:
+            viewer = self.by_sid.get(sid)
+            if viewer is None:
+                return
+            frame, viewer.pending = viewer.pending, None
+            if frame is None:
+                viewer.in_flight = max(0, viewer.in_flight - 1)
+            else:
+                self._queue(sid, frame)  # one acknowledged, one more out
+
+    def stats(self):
+        return {
+            'watched': len(self.viewers),
+            'viewers': len(self.by_sid),
+            'encoded': self.encoded,
+            'sent': self.sent,
+            'dropped': self.dropped,
+        }
@@ -0,0 +1,50 @@
+import math
+import threading
+
+MAX_TICKS = 9000  # ticks kept per level (5 minutes at 30 Hz); later ticks are computed on demand
+CHUNK = 256       # rows added at a time when the table grows
+
+
+class TrajectoryTable:
+    """x of every moving tile/plate of one level at each tick, shared by all sessions.
+
+    Row `tick` holds one x per entry of LevelTemplate.moving, computed with
+    the same expression update() always used, so values are bit-identical.
+    Tick 0 is the authored start position. Rows are tuples, so a session
+    can keep a reference to the current row instead of copying it.
+    """
+
+    def __init__(self, moving, start_x, max_ticks=MAX_TICKS):
+        self.moving = moving
+        self.max_ticks = max_ticks
+        self.rows = [tuple(start_x)]
+        self.lock = threading.Lock()
+
+    def at(self, tick):
+        """Tuple of x positions at `tick`."""
+        rows = self.rows
+        if tick < len(rows):
+            return rows[tick]
+        if tick >= self.max_ticks:
+            return self._row(tick)
+        self._grow(tick)
+        return self.rows[tick]
+
+    def bounds(self, mi):
+        """(min x, max x) entry `mi` can ever reach, start position included.
+
+        LevelTemplate.moving_sweep, the box the broad phase and the idle
+        check use for a moving collider, is built from this.
+        """
+        center, amp, _ = self.moving[mi]
+        start = self.rows[0][mi]
+        return min(start, center - abs(amp)), max(start, center + abs(amp))
+
+    def _row(self, tick):
+        return tuple(center + amp * math.sin(tick * speed) for center, amp, speed in self.moving)
+
+    def _grow(self, tick):
+        with self.lock:
+            rows = self.rows
+            end = min(self.max_ticks, max(tick + 1, len(rows) + CHUNK))
+            rows.extend(self._row(t) for t in range(len(rows), end))
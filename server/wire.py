@@ -0,0 +1,133 @@
+"""Compact binary encoding for inputs and dynamic frames.
+
+Sessions started with {"encoding": "binary"} get binary frames instead of
+JSON deltas once the client holds a full frame. Full frames (the static
+level layout) stay JSON, so they are still sent on join and resync.
+
+A dynamic frame is little-endian:
+
+    u8  kind          always FRAME
+    u8  status bits   1 win, 2 goal_locked, 4 doors_open
+    u32 tick
+    i32 ack           client tick acknowledged (see TickScheduler), -1 if none
+    u8  players, u8 moving, u8 plates
+    per player        i16 x, y, vx, vy in 1/8 px, u8 on_ground
+    per moving        i16 x in 1/8 px, in template.moving_refs order
+    plate flags       2 bits per plate (active, triggered), packed LSB first
+
+Players are in p1, p2 order and plates in template order (pressure plates,
+goal plate, goal plates), which is the order they appear in a full frame.
+Every flag is always included, so unlike JSON deltas a binary frame applies
+on top of any earlier frame of the same session.
+
+Inputs are 3 bits per player (left, right, jump), p1 in the low bits.
+/api/input takes them as an 8 byte session id, i32 since tick (-1 for a
+full frame), i32 input seq (-1 if the client does not predict) and a u8 of
+input bits. /api/input_batch takes the session id, i32 since tick, i32
+seq of the first tick and then one byte of input bits per tick.
+"""
+import struct
+
+FRAME = 1
+SCALE = 8  # positions are sent in 1/8 px
+
+WIN, GOAL_LOCKED, DOORS_OPEN = 1, 2, 4
+KEYS = ('left', 'right', 'jump')
+ENCODINGS = ('json', 'binary')
+CONTENT_TYPE = 'application/octet-stream'
+
+_INPUT_REQUEST = struct.Struct('<8siiB')
+_BATCH_HEADER = struct.Struct('<8sii')
+_layouts = {}  # (players, moving, plates) -> struct.Struct
+
+
+def _layout(players, moving, plates):
+    key = (players, moving, plates)
+    layout = _layouts.get(key)
+    if layout is None:
+        fmt = '<BBIiBBB' + 'hhhhB' * players + 'h' * moving + 'B' * ((2 * plates + 7) // 8)
+        layout = _layouts[key] = struct.Struct(fmt)
+    return layout
+
+
+def _q(v):
+    return max(-32768, min(32767, int(round(v * SCALE))))
+
+
+def encode_frame(state, win, ack=None):
+    """Packs the dynamic part of a GameState into bytes."""
+    players = state.players.values()
+    plates = len(state.active)
+    status = (WIN if win else 0) | (GOAL_LOCKED if state.goal_locked else 0) | \
+             (DOORS_OPEN if state.doors_open else 0)
+    values = [FRAME, status, state.tick, -1 if ack is None else ack,
+              len(players), len(state.moving_x), plates]
+    for p in players:
+        values += (_q(p.x), _q(p.y), _q(p.vx), _q(p.vy), p.on_ground)
+    values += [_q(x) for x in state.moving_x]
+    bits = 0
+    for i, (a, t) in enumerate(zip(state.active, state.triggered)):
+        bits |= (a << (2 * i)) | (t << (2 * i + 1))
+    values += bits.to_bytes((2 * plates + 7) // 8, 'little')
+    return _layout(len(players), len(state.moving_x), plates).pack(*values)
+
+
+def decode_frame(data):
+    """Inverse of encode_frame, as plain values. Used for checks and tools."""
+    _, status, tick, ack, n_players, n_moving, n_plates = struct.unpack_from('<BBIiBBB', data)
+    values = _layout(n_players, n_moving, n_plates).unpack(data)[7:]
+    players = {}
+    for i in range(n_players):
+        x, y, vx, vy, on_ground = values[5 * i:5 * i + 5]
+        players[f'p{i+1}'] = {'x': x / SCALE, 'y': y / SCALE, 'vx': vx / SCALE,
+                              'vy': vy / SCALE, 'on_ground': bool(on_ground)}
+    rest = values[5 * n_players:]
+    bits = int.from_bytes(bytes(rest[n_moving:]), 'little')
+    return {
+        'tick': tick,
+        'ack': ack if ack >= 0 else None,
+        'win': bool(status & WIN),
+        'goal_locked': bool(status & GOAL_LOCKED),
+        'doors_open': bool(status & DOORS_OPEN),
+        'players': players,
+        'moving': [x / SCALE for x in rest[:n_moving]],
+        'plates': [(bool(bits >> (2 * i) & 1), bool(bits >> (2 * i + 1) & 1)) for i in range(n_plates)],
+    }
+
+
+def pack_inputs(inputs):
+    bits = 0
+    for i in range(2):
+        inp = inputs.get(f'p{i+1}') or {}
+        for k, key in enumerate(KEYS):
+            if inp.get(key):
+                bits |= 1 << (3 * i + k)
+    return bits
+
+
+def unpack_inputs(bits, num_players):
+    return {
+        f'p{i+1}': {key: bool(bits >> (3 * i + k) & 1) for k, key in enumerate(KEYS)}
+        for i in range(num_players)
+    }
+
+
+def decode_input_request(body):
+    """(session_id, since, seq, input bits) from a binary /api/input body.
+
+    since and seq are None when the client sent -1.
+    """
+    if len(body) != _INPUT_REQUEST.size:
+        raise ValueError('bad input request size')
+    session_id, since, seq, bits = _INPUT_REQUEST.unpack(body)
+    return (session_id.decode('ascii').rstrip('\0'), since if since >= 0 else None,
+            seq if seq >= 0 else None, bits)
+
+
+def decode_batch_request(body):
+    """(session_id, since, first seq, [input bits per tick]) from a binary batch body."""
+    if len(body) < _BATCH_HEADER.size:
+        raise ValueError('bad batch request size')
+    session_id, since, seq = _BATCH_HEADER.unpack_from(body)
+    return (session_id.decode('ascii').rstrip('\0'), since if since >= 0 else None,
+            seq, list(body[_BATCH_HEADER.size:]))